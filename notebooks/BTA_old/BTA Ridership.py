@@ -6,17 +6,23 @@ from dash import dcc, html
 from dash.dependencies import Input, Output
 import zipfile
 from io import BytesIO
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gtfs_schema import read_gtfs_table, print_memory_report
 import math
 
 # Load GTFS feed data
 def load_gtfs_data(gtfs_zip_path):
     # Read GTFS data
+    memory_report = {}
     with zipfile.ZipFile(gtfs_zip_path, 'r') as gtfs_zip:
-        routes = pd.read_csv(BytesIO(gtfs_zip.read("routes.txt")))
-        shapes = pd.read_csv(BytesIO(gtfs_zip.read("shapes.txt")))
-        trips = pd.read_csv(BytesIO(gtfs_zip.read("trips.txt")))
-        stops = pd.read_csv(BytesIO(gtfs_zip.read("stops.txt")))
-        stop_times = pd.read_csv(BytesIO(gtfs_zip.read("stop_times.txt")))
+        routes = read_gtfs_table(gtfs_zip, "routes", memory_report)
+        shapes = read_gtfs_table(gtfs_zip, "shapes", memory_report)
+        trips = read_gtfs_table(gtfs_zip, "trips", memory_report)
+        stops = read_gtfs_table(gtfs_zip, "stops", memory_report)
+        stop_times = read_gtfs_table(gtfs_zip, "stop_times", memory_report)
+    print_memory_report(memory_report)
 
     print("GTFS Data - Routes, Trips, and Stop Times:")
     print("Routes:", routes.head())
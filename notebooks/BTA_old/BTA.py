@@ -3,8 +3,15 @@ import folium
 import zipfile
 import tempfile
 import os
-from collections import defaultdict
 import numpy as np
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gtfs_schema import read_gtfs_table, print_memory_report
+from shape_simplify import SIMPLIFY_LEVELS, add_significance, level_for_zoom, simplification_report, print_simplification_report
+from transfers import find_transfers, stop_route_pairs, walk_transfer_clusters
+from ridership_cube import build_ridership_cube, stop_totals
+
+SHAPE_DETAIL_ZOOM = 14  # Route shapes are simplified to stay under half a pixel up to this zoom
 
 class TransitPlanningTool:
     def __init__(self, gtfs_zip_path, ridership_csv_path):
@@ -34,11 +41,18 @@ class TransitPlanningTool:
         with zipfile.ZipFile(gtfs_zip_path, 'r') as zip_ref:
             zip_ref.extractall(self.temp_dir)
         
-        self.routes = pd.read_csv(os.path.join(self.temp_dir, 'routes.txt'))
-        self.stops = pd.read_csv(os.path.join(self.temp_dir, 'stops.txt'))
-        self.trips = pd.read_csv(os.path.join(self.temp_dir, 'trips.txt'))
-        self.stop_times = pd.read_csv(os.path.join(self.temp_dir, 'stop_times.txt'))
-        self.shapes = pd.read_csv(os.path.join(self.temp_dir, 'shapes.txt'))
+        memory_report = {}
+        self.routes = read_gtfs_table(self.temp_dir, 'routes', memory_report)
+        self.stops = read_gtfs_table(self.temp_dir, 'stops', memory_report)
+        self.trips = read_gtfs_table(self.temp_dir, 'trips', memory_report)
+        self.stop_times = read_gtfs_table(self.temp_dir, 'stop_times', memory_report)
+        self.shapes = read_gtfs_table(self.temp_dir, 'shapes', memory_report)
+        print_memory_report(memory_report)
+
+        # Per-vertex significance once; maps then filter to the level for their zoom
+        self.shapes = add_significance(self.shapes)
+        self.shape_level = level_for_zoom(SHAPE_DETAIL_ZOOM, self.stops['stop_lat'].mean())
+        print_simplification_report(simplification_report(self.shapes, self.shape_level), self.shape_level)
         
         self.ridership = pd.read_csv(ridership_csv_path)
         self.ridership['Ridership'] = pd.to_numeric(self.ridership['Ridership'], errors='coerce').fillna(0)
@@ -58,50 +72,35 @@ class TransitPlanningTool:
         self.calculate_transfer_ridership()
     
     def identify_transfers(self):
-        """Identify transfer points between routes."""
-        stop_routes = defaultdict(set)
-        
-        # Find routes serving each stop
-        for _, row in self.trips.merge(self.stop_times, on='trip_id').iterrows():
-            stop_routes[row['stop_id']].add(str(row['route_id']))
-        
-        # Find stops served by multiple routes
-        self.transfers = []
-        for stop_id, routes in stop_routes.items():
-            if len(routes) > 1:
-                stop_info = self.stops[self.stops['stop_id'] == stop_id].iloc[0]
-                self.transfers.append({
-                    'stop_id': stop_id,
-                    'stop_name': stop_info['stop_name'],
-                    'routes': list(routes),
-                    'coordinates': [stop_info['stop_lat'], stop_info['stop_lon']]
-                })
+        """Identify transfer points between routes, at shared stops and by walking between nearby stops."""
+        pairs = stop_route_pairs(self.trips, self.stop_times)
+        self.transfers = find_transfers(pairs, self.stops).to_dict('records')
+        self.walk_transfers = walk_transfer_clusters(pairs, self.stops)
     
     def calculate_transfer_ridership(self):
         """Calculate combined ridership for transfer points."""
+        # (route, stop) totals once; every transfer's routes are then summed in one join
+        self.ridership_cube = build_ridership_cube(self.ridership, stop_column='Stop ID')
+        pairs = pd.DataFrame(self.transfers, columns=['stop_id', 'routes']).explode('routes')
+        totals = stop_totals(self.ridership_cube, pairs, route_column='routes')
         for transfer in self.transfers:
-            total_ridership = 0
-            for route in transfer['routes']:
-                route_ridership = self.ridership[
-                    (self.ridership['Route'].astype(str) == route) & 
-                    (self.ridership['Stop ID'] == transfer['stop_id'])
-                ]['Ridership'].sum()
-                total_ridership += route_ridership
-            transfer['total_ridership'] = total_ridership
+            transfer['total_ridership'] = totals.get(str(transfer['stop_id']), 0)
     
-    def get_route_shape(self, route_id):
-        """Get shape points for a route."""
+    def get_route_shape(self, route_id, level=None):
+        """Get shape points for a route, simplified to the given level (default: the map's detail level)."""
         route_trips = self.trips[self.trips['route_id'] == route_id]
         if route_trips.empty:
             return None
         
         shape_id = route_trips.iloc[0]['shape_id']
-        shape_points = self.shapes[self.shapes['shape_id'] == shape_id].sort_values('shape_pt_sequence')
+        tolerance = SIMPLIFY_LEVELS[level or self.shape_level]
+        # Shapes are already sorted by add_significance
+        shape_points = self.shapes[(self.shapes['shape_id'] == shape_id) & (self.shapes['significance'] >= tolerance)]
         
         if shape_points.empty:
             return None
         
-        return [[row.shape_pt_lat, row.shape_pt_lon] for _, row in shape_points.iterrows()]
+        return shape_points[['shape_pt_lat', 'shape_pt_lon']].values.tolist()
     
     def create_map(self, output_html_path, selected_routes=None):
         """Create interactive map with selected routes."""
@@ -9,9 +9,18 @@ from shapely.geometry import LineString, Point
 import json
 import branca.colormap as cm
 import numpy as np
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gtfs_schema import read_gtfs_table, print_memory_report
+from shape_simplify import SIMPLIFY_LEVELS, add_significance, level_for_zoom, simplification_report, print_simplification_report
+from transfers import find_transfers, stop_route_pairs, walk_transfer_clusters
+from coverage import SYSTEM, cached_coverage_table, print_coverage_report
+from headways import ALL_DAYS, DEFAULT_PERIODS, route_headways, stop_headways
 from datetime import datetime
 from collections import defaultdict
 
+SHAPE_DETAIL_ZOOM = 14  # Route shapes are simplified to stay under half a pixel up to this zoom
+
 class TransitPlanningTool:
     def __init__(self, gtfs_zip_path, ridership_csv_path):
         """Initialize the transit planning tool with GTFS and ridership data."""
@@ -22,34 +31,34 @@ class TransitPlanningTool:
     def load_data(self, gtfs_zip_path, ridership_csv_path):
         """Load GTFS and ridership data."""
         # Extract GTFS files
+        self.gtfs_zip_path = gtfs_zip_path
         with zipfile.ZipFile(gtfs_zip_path, 'r') as zip_ref:
             zip_ref.extractall(self.temp_dir)
         
         # Load GTFS files
-        self.routes = pd.read_csv(os.path.join(self.temp_dir, 'routes.txt'))
-        self.stops = pd.read_csv(os.path.join(self.temp_dir, 'stops.txt'))
-        self.trips = pd.read_csv(os.path.join(self.temp_dir, 'trips.txt'))
-        self.stop_times = pd.read_csv(os.path.join(self.temp_dir, 'stop_times.txt'))
-        self.shapes = pd.read_csv(os.path.join(self.temp_dir, 'shapes.txt'))
+        memory_report = {}
+        self.routes = read_gtfs_table(self.temp_dir, 'routes', memory_report)
+        self.stops = read_gtfs_table(self.temp_dir, 'stops', memory_report)
+        self.trips = read_gtfs_table(self.temp_dir, 'trips', memory_report)
+        self.stop_times = read_gtfs_table(self.temp_dir, 'stop_times', memory_report)
+        self.shapes = read_gtfs_table(self.temp_dir, 'shapes', memory_report)
+
+        # Service calendars split headways by day type; either file may be missing
+        calendar_path = os.path.join(self.temp_dir, 'calendar.txt')
+        calendar_dates_path = os.path.join(self.temp_dir, 'calendar_dates.txt')
+        self.calendar = read_gtfs_table(self.temp_dir, 'calendar', memory_report) if os.path.exists(calendar_path) else None
+        self.calendar_dates = read_gtfs_table(self.temp_dir, 'calendar_dates', memory_report) if os.path.exists(calendar_dates_path) else None
+        print_memory_report(memory_report)
+
+        # Per-vertex significance once; maps then filter to the level for their zoom
+        self.shapes = add_significance(self.shapes)
+        self.shape_level = level_for_zoom(SHAPE_DETAIL_ZOOM, self.stops['stop_lat'].mean())
+        print_simplification_report(simplification_report(self.shapes, self.shape_level), self.shape_level)
         
         # Load ridership data and ensure Ridership is numeric
         self.ridership = pd.read_csv(ridership_csv_path)
         self.ridership['Ridership'] = pd.to_numeric(self.ridership['Ridership'], errors='coerce').fillna(0)
     
-    def parse_time(self, time_str):
-        """Parse GTFS time string to datetime."""
-        try:
-            # Handle times past 24:00:00
-            hours, minutes, seconds = map(int, time_str.split(':'))
-            total_seconds = hours * 3600 + minutes * 60 + seconds
-            normalized_seconds = total_seconds % 86400  # Normalize to 24-hour period
-            normalized_hours = normalized_seconds // 3600
-            normalized_minutes = (normalized_seconds % 3600) // 60
-            normalized_seconds = normalized_seconds % 60
-            return f"{normalized_hours:02d}:{normalized_minutes:02d}:{normalized_seconds:02d}"
-        except:
-            return None
-
     def calculate_metrics(self):
         """Calculate key transit service metrics."""
         self.calculate_frequencies()
@@ -57,79 +66,30 @@ class TransitPlanningTool:
         self.calculate_coverage()
     
     def calculate_frequencies(self):
-        """Calculate peak and off-peak frequencies by route."""
+        """Calculate headways by route, stop, day type and period."""
+        self.headways = stop_headways(self.trips, self.stop_times, DEFAULT_PERIODS, self.calendar, self.calendar_dates)
+        route_table = route_headways(self.headways)
+
+        # Routes are coloured by weekday service (all service when the feed has no calendar)
+        day_type = 'weekday' if (route_table['day_type'] == 'weekday').any() else ALL_DAYS
         self.frequencies = defaultdict(dict)
-        
-        peak_periods = [
-            ('AM_Peak', '06:00:00', '09:00:00'),
-            ('PM_Peak', '15:00:00', '18:00:00')
-        ]
-        
-        for route_id in self.routes['route_id']:
-            route_trips = self.trips[self.trips['route_id'] == route_id]
-            
-            for period, start, end in peak_periods:
-                period_times = self.stop_times[
-                    (self.stop_times['trip_id'].isin(route_trips['trip_id'])) &
-                    (self.stop_times['arrival_time'] >= start) &
-                    (self.stop_times['arrival_time'] <= end)
-                ]
-                
-                if not period_times.empty:
-                    stops = period_times['stop_id'].unique()
-                    headways = []
-                    
-                    for stop in stops:
-                        stop_times = period_times[period_times['stop_id'] == stop]['arrival_time']
-                        if len(stop_times) > 1:
-                            # Parse and sort times
-                            parsed_times = [self.parse_time(t) for t in stop_times]
-                            parsed_times = [t for t in parsed_times if t is not None]
-                            if len(parsed_times) > 1:
-                                times = pd.to_datetime(parsed_times, format='%H:%M:%S').sort_values()
-                                headway = times.diff().mean().total_seconds() / 60
-                                headways.append(headway)
-                    
-                    if headways:
-                        self.frequencies[route_id][period] = np.mean(headways)
+        for row in route_table[route_table['day_type'] == day_type].itertuples(index=False):
+            self.frequencies[row.route_id][row.period] = row.mean_headway_min
     
     def identify_transfers(self):
-        """Identify transfer points between routes."""
-        stop_routes = defaultdict(set)
-        
-        # Find routes serving each stop
-        for _, row in self.trips.merge(self.stop_times, on='trip_id').iterrows():
-            stop_routes[row['stop_id']].add(row['route_id'])
-        
-        # Find stops served by multiple routes
-        self.transfers = []
-        for stop_id, routes in stop_routes.items():
-            if len(routes) > 1:
-                stop_info = self.stops[self.stops['stop_id'] == stop_id].iloc[0]
-                self.transfers.append({
-                    'stop_id': stop_id,
-                    'stop_name': stop_info['stop_name'],
-                    'routes': list(routes),
-                    'coordinates': [stop_info['stop_lat'], stop_info['stop_lon']]
-                })
+        """Identify transfer points between routes, at shared stops and by walking between nearby stops."""
+        self.stop_route_pairs = stop_route_pairs(self.trips, self.stop_times)
+        self.transfers = find_transfers(self.stop_route_pairs, self.stops).to_dict('records')
+        self.walk_transfers = walk_transfer_clusters(self.stop_route_pairs, self.stops)
     
     def calculate_coverage(self):
-        """Calculate 400m walking distance coverage."""
-        # Create GeoDataFrame with explicit CRS
-        self.stops_gdf = gpd.GeoDataFrame(
-            self.stops, 
-            geometry=[Point(xy) for xy in zip(self.stops['stop_lon'], self.stops['stop_lat'])],
-            crs="EPSG:4326"
-        )
-        
-        # Project to Web Mercator for consistent visualization
-        self.stops_projected = self.stops_gdf.to_crs("EPSG:3857")
-        
-        # Create 400m buffers
-        self.coverage = self.stops_projected.buffer(400)
-        
-        # Project back to WGS84 for Folium
-        self.coverage = gpd.GeoSeries(self.coverage, crs="EPSG:3857").to_crs("EPSG:4326")
+        """Calculate dissolved 400m walking distance coverage per route, agency and system (cached per feed)."""
+        self.coverage_stats = cached_coverage_table(self.gtfs_zip_path, self.stops, self.stop_route_pairs, self.routes)
+        print_coverage_report(self.coverage_stats)
+
+        # One dissolved polygon for the map instead of a circle per stop
+        system = self.coverage_stats[self.coverage_stats['level'] == SYSTEM]
+        self.coverage = gpd.GeoSeries(system['geometry'].to_list(), crs="EPSG:4326")
     
     def create_map(self, output_html_path):
         """Create interactive map with analysis layers."""
@@ -163,7 +123,7 @@ class TransitPlanningTool:
             shape_points = self.get_route_shape(route_id)
             if shape_points is not None:
                 # Color based on AM peak frequency
-                frequency = self.frequencies[route_id].get('AM_Peak', float('inf'))
+                frequency = self.frequencies[str(route_id)].get('AM_Peak', float('inf'))
                 color = self.get_frequency_color(frequency)
                 
                 folium.PolyLine(
@@ -204,6 +164,17 @@ class TransitPlanningTool:
                 fill=True,
                 fill_opacity=0.7
             ).add_to(m)
+
+        # Nearby stops that together reach more routes than any one of them
+        for walk in self.walk_transfers.itertuples(index=False):
+            folium.CircleMarker(
+                location=[walk.stop_lat, walk.stop_lon],
+                radius=10,
+                color='purple',
+                dash_array='4',
+                popup=f"Walk Transfer<br>{walk.stop_count} stops within {walk.spread_m:.0f} m<br>Routes: {', '.join(walk.routes)}",
+                fill=False
+            ).add_to(m)
     
     def add_coverage(self, m):
         """Add service coverage area."""
@@ -235,19 +206,21 @@ class TransitPlanningTool:
         '''
         m.get_root().html.add_child(folium.Element(legend_html))
     
-    def get_route_shape(self, route_id):
-        """Get shape points for a route."""
+    def get_route_shape(self, route_id, level=None):
+        """Get shape points for a route, simplified to the given level (default: the map's detail level)."""
         route_trips = self.trips[self.trips['route_id'] == route_id]
         if route_trips.empty:
             return None
         
         shape_id = route_trips.iloc[0]['shape_id']
-        shape_points = self.shapes[self.shapes['shape_id'] == shape_id].sort_values('shape_pt_sequence')
+        tolerance = SIMPLIFY_LEVELS[level or self.shape_level]
+        # Shapes are already sorted by add_significance
+        shape_points = self.shapes[(self.shapes['shape_id'] == shape_id) & (self.shapes['significance'] >= tolerance)]
         
         if shape_points.empty:
             return None
         
-        return [[row.shape_pt_lat, row.shape_pt_lon] for _, row in shape_points.iterrows()]
+        return shape_points[['shape_pt_lat', 'shape_pt_lon']].values.tolist()
     
     @staticmethod
     def get_frequency_color(frequency):
@@ -6,28 +6,38 @@ from dash import dcc, html
 from dash.dependencies import Input, Output
 import zipfile
 from io import BytesIO
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gtfs_schema import read_gtfs_table, print_memory_report
+from selection_cache import memoize_selection
+from ridership_cube import clean_ridership
+from stop_matching import match_ridership_stops, print_match_report
+from transfers import stop_route_pairs
 
 # Load GTFS feed and ridership data
 def load_gtfs_and_ridership(gtfs_zip_path, ridership_file):
     # Read GTFS data
+    memory_report = {}
     with zipfile.ZipFile(gtfs_zip_path, 'r') as gtfs_zip:
-        routes = pd.read_csv(BytesIO(gtfs_zip.read("routes.txt")))
-        shapes = pd.read_csv(BytesIO(gtfs_zip.read("shapes.txt")))
-        trips = pd.read_csv(BytesIO(gtfs_zip.read("trips.txt")))
-        stops = pd.read_csv(BytesIO(gtfs_zip.read("stops.txt")))
-        stop_times = pd.read_csv(BytesIO(gtfs_zip.read("stop_times.txt")))
+        routes = read_gtfs_table(gtfs_zip, "routes", memory_report)
+        shapes = read_gtfs_table(gtfs_zip, "shapes", memory_report)
+        trips = read_gtfs_table(gtfs_zip, "trips", memory_report)
+        stops = read_gtfs_table(gtfs_zip, "stops", memory_report)
+        stop_times = read_gtfs_table(gtfs_zip, "stop_times", memory_report)
+    print_memory_report(memory_report)
 
     # Load ridership data
     ridership = pd.read_csv(ridership_file)
-    ridership = ridership.rename(columns={"Route": "route_id", "Stop ID": "stop_id", "Ridership": "ridership"})
-    ridership['ridership'] = pd.to_numeric(ridership['ridership'], errors='coerce').fillna(0)
+    ridership = ridership.rename(columns={"Route": "route_id", "Stop ID": "stop_id", "Stop": "stop_id", "Ridership": "ridership"})
+    ridership['ridership'] = clean_ridership(ridership['ridership'])
     ridership['stop_id'] = ridership['stop_id'].astype(str).str.strip()
     ridership['route_id'] = ridership['route_id'].astype(str).str.strip()
 
     return routes, shapes, trips, stops, stop_times, ridership
 
 # Process data
-def process_routes(routes, shapes, trips, stop_times, ridership):
+def process_routes(routes, shapes, trips, stops, stop_times, ridership):
     # Normalize IDs to strings
     routes['route_id'] = routes['route_id'].astype(str)
     trips['route_id'] = trips['route_id'].astype(str)
@@ -67,6 +77,13 @@ def process_routes(routes, shapes, trips, stop_times, ridership):
     print("\nRoutes in GTFS trips but not in ridership.csv:")
     print(missing_routes_in_ridership)
 
+    # Ridership stops GTFS doesn't serve on that route fall back to the route's nearest stop
+    if {'Lat', 'Lon'} <= set(ridership.columns):
+        matches = match_ridership_stops(ridership, stops, stop_route_pairs(trips, stop_times))
+        print("\nRidership Stop Matching:")
+        print_match_report(ridership, matches)
+        ridership = ridership.assign(stop_id=matches['matched_stop_id'].fillna(ridership['stop_id']))
+        ridership = ridership.groupby(['route_id', 'stop_id'], as_index=False)['ridership'].sum()
 
     # Merge ridership data
     stop_routes_ridership = stop_routes.merge(
@@ -152,8 +169,14 @@ def create_map(routes, shapes, stops, stop_routes_ridership, active_routes=None)
     return transit_map
 
 # Generate the app
-def generate_app(routes, shapes, stops, stop_routes_ridership, map_file):
+def generate_app(routes, shapes, stops, stop_routes_ridership):
     app = dash.Dash(__name__)
+
+    # Pages are rendered in memory and memoized per route selection
+    def render_html(active_routes):
+        return create_map(routes, shapes, stops, stop_routes_ridership, active_routes=active_routes).get_root().render()
+
+    render = memoize_selection(render_html)
     route_options = [{"label": f"Route {route_id}", "value": route_id} for route_id in routes['route_id'].unique()]
 
     app.layout = html.Div([
@@ -164,7 +187,7 @@ def generate_app(routes, shapes, stops, stop_routes_ridership, map_file):
             value=["1"],
             inline=True
         ),
-        html.Iframe(id="map", srcDoc=open(map_file, "r").read(), width="100%", height="600")
+        html.Iframe(id="map", srcDoc=render(["1"]), width="100%", height="600")
     ])
 
     @app.callback(
@@ -172,9 +195,7 @@ def generate_app(routes, shapes, stops, stop_routes_ridership, map_file):
         Input("route-selector", "value")
     )
     def update_map(selected_routes):
-        updated_map = create_map(routes, shapes, stops, stop_routes_ridership, active_routes=selected_routes)
-        updated_map.save(map_file)
-        return open(map_file, "r").read()
+        return render(selected_routes)
 
     return app
 
@@ -185,13 +206,8 @@ if __name__ == "__main__":
 
     # Load and process GTFS data
     routes, shapes, trips, stops, stop_times, ridership = load_gtfs_and_ridership(gtfs_zip_path, ridership_file)
-    routes, shapes, stops, stop_routes_ridership = process_routes(routes, shapes, trips, stop_times, ridership)
-
-    # Create the initial map with Route 1 visible
-    map_file = "transit_map.html"
-    base_map = create_map(routes, shapes, stops, stop_routes_ridership, active_routes=["1"])
-    base_map.save(map_file)
+    routes, shapes, stops, stop_routes_ridership = process_routes(routes, shapes, trips, stops, stop_times, ridership)
 
     # Run the Dash app
-    app = generate_app(routes, shapes, stops, stop_routes_ridership, map_file)
+    app = generate_app(routes, shapes, stops, stop_routes_ridership)
     app.run_server(debug=True)
@@ -6,16 +6,23 @@ from dash import dcc, html
 from dash.dependencies import Input, Output
 import zipfile
 from io import BytesIO
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gtfs_schema import read_gtfs_table, print_memory_report
+from selection_cache import memoize_selection
 
 # Load GTFS feed and ridership data
 def load_gtfs_and_ridership(gtfs_zip_path, ridership_file):
     # Read GTFS data
+    memory_report = {}
     with zipfile.ZipFile(gtfs_zip_path, 'r') as gtfs_zip:
-        routes = pd.read_csv(BytesIO(gtfs_zip.read("routes.txt")))
-        shapes = pd.read_csv(BytesIO(gtfs_zip.read("shapes.txt")))
-        trips = pd.read_csv(BytesIO(gtfs_zip.read("trips.txt")))
-        stops = pd.read_csv(BytesIO(gtfs_zip.read("stops.txt")))
-        stop_times = pd.read_csv(BytesIO(gtfs_zip.read("stop_times.txt")))
+        routes = read_gtfs_table(gtfs_zip, "routes", memory_report)
+        shapes = read_gtfs_table(gtfs_zip, "shapes", memory_report)
+        trips = read_gtfs_table(gtfs_zip, "trips", memory_report)
+        stops = read_gtfs_table(gtfs_zip, "stops", memory_report)
+        stop_times = read_gtfs_table(gtfs_zip, "stop_times", memory_report)
+    print_memory_report(memory_report)
 
     # Load ridership data
     ridership = pd.read_csv(ridership_file)
@@ -104,8 +111,14 @@ def create_map(routes, shapes, stops, stop_routes_ridership, active_routes=None)
     return transit_map
 
 # Generate the app
-def generate_app(routes, shapes, stops, stop_routes_ridership, map_file):
+def generate_app(routes, shapes, stops, stop_routes_ridership):
     app = dash.Dash(__name__)
+
+    # Pages are rendered in memory and memoized per route selection
+    def render_html(active_routes):
+        return create_map(routes, shapes, stops, stop_routes_ridership, active_routes=active_routes).get_root().render()
+
+    render = memoize_selection(render_html)
     route_options = [{"label": f"Route {route_id}", "value": route_id} for route_id in routes['route_id'].unique()]
 
     app.layout = html.Div([
@@ -116,7 +129,7 @@ def generate_app(routes, shapes, stops, stop_routes_ridership, map_file):
             value=["1"],
             inline=True
         ),
-        html.Iframe(id="map", srcDoc=open(map_file, "r").read(), width="100%", height="600")
+        html.Iframe(id="map", srcDoc=render(["1"]), width="100%", height="600")
     ])
 
     @app.callback(
@@ -124,9 +137,7 @@ def generate_app(routes, shapes, stops, stop_routes_ridership, map_file):
         Input("route-selector", "value")
     )
     def update_map(selected_routes):
-        updated_map = create_map(routes, shapes, stops, stop_routes_ridership, active_routes=selected_routes)
-        updated_map.save(map_file)
-        return open(map_file, "r").read()
+        return render(selected_routes)
 
     return app
 
@@ -139,11 +150,6 @@ if __name__ == "__main__":
     routes, shapes, trips, stops, stop_times, ridership = load_gtfs_and_ridership(gtfs_zip_path, ridership_file)
     routes, shapes, stops, stop_routes_ridership = process_routes(routes, shapes, trips, stop_times, ridership)
 
-    # Create the initial map with Route 1 visible
-    map_file = "transit_map.html"
-    base_map = create_map(routes, shapes, stops, stop_routes_ridership, active_routes=["1"])
-    base_map.save(map_file)
-
     # Run the Dash app
-    app = generate_app(routes, shapes, stops, stop_routes_ridership, map_file)
+    app = generate_app(routes, shapes, stops, stop_routes_ridership)
     app.run_server(debug=True)
@@ -6,16 +6,23 @@ from dash import dcc, html
 from dash.dependencies import Input, Output
 import zipfile
 from io import BytesIO
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gtfs_schema import read_gtfs_table, print_memory_report
+from selection_cache import memoize_selection
 
 # Load GTFS feed data
 def load_gtfs_data(gtfs_zip_path):
     # Read GTFS data
+    memory_report = {}
     with zipfile.ZipFile(gtfs_zip_path, 'r') as gtfs_zip:
-        routes = pd.read_csv(BytesIO(gtfs_zip.read("routes.txt")))
-        shapes = pd.read_csv(BytesIO(gtfs_zip.read("shapes.txt")))
-        trips = pd.read_csv(BytesIO(gtfs_zip.read("trips.txt")))
-        stops = pd.read_csv(BytesIO(gtfs_zip.read("stops.txt")))
-        stop_times = pd.read_csv(BytesIO(gtfs_zip.read("stop_times.txt")))
+        routes = read_gtfs_table(gtfs_zip, "routes", memory_report)
+        shapes = read_gtfs_table(gtfs_zip, "shapes", memory_report)
+        trips = read_gtfs_table(gtfs_zip, "trips", memory_report)
+        stops = read_gtfs_table(gtfs_zip, "stops", memory_report)
+        stop_times = read_gtfs_table(gtfs_zip, "stop_times", memory_report)
+    print_memory_report(memory_report)
 
     print("GTFS Data - Routes, Trips, and Stop Times:")
     print("Routes:", routes.head())
@@ -100,8 +107,14 @@ def create_map(routes, shapes, stops, stop_routes, active_routes=None):
 
 
 # Generate the app
-def generate_app(routes, shapes, stops, stop_routes, map_file):
+def generate_app(routes, shapes, stops, stop_routes):
     app = dash.Dash(__name__)
+
+    # Pages are rendered in memory and memoized per route selection
+    def render_html(active_routes):
+        return create_map(routes, shapes, stops, stop_routes, active_routes=active_routes).get_root().render()
+
+    render = memoize_selection(render_html)
     route_options = [{"label": f"Route {route_id}", "value": route_id} for route_id in routes['route_id'].unique()]
 
     app.layout = html.Div([
@@ -112,7 +125,7 @@ def generate_app(routes, shapes, stops, stop_routes, map_file):
             value=["1"],
             inline=True
         ),
-        html.Iframe(id="map", srcDoc=open(map_file, "r").read(), width="100%", height="600")
+        html.Iframe(id="map", srcDoc=render(["1"]), width="100%", height="600")
     ])
 
     @app.callback(
@@ -120,9 +133,7 @@ def generate_app(routes, shapes, stops, stop_routes, map_file):
         Input("route-selector", "value")
     )
     def update_map(selected_routes):
-        updated_map = create_map(routes, shapes, stops, stop_routes, active_routes=selected_routes)
-        updated_map.save(map_file)
-        return open(map_file, "r").read()
+        return render(selected_routes)
 
     return app
 
@@ -134,11 +145,6 @@ if __name__ == "__main__":
     routes, shapes, trips, stops, stop_times = load_gtfs_data(gtfs_zip_path)
     routes, shapes, stops, stop_routes = process_routes(routes, shapes, trips, stop_times)
 
-    # Create the initial map with Route 1 visible
-    map_file = "transit_map.html"
-    base_map = create_map(routes, shapes, stops, stop_routes, active_routes=["1"])
-    base_map.save(map_file)
-
     # Run the Dash app
-    app = generate_app(routes, shapes, stops, stop_routes, map_file)
+    app = generate_app(routes, shapes, stops, stop_routes)
     app.run_server(debug=True)
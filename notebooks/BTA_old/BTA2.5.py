@@ -1,13 +1,17 @@
 import pandas as pd
 import folium
-from folium import plugins
 import branca.colormap as cm
-import numpy as np
 from pathlib import Path
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from hex_bins import HEX_SIZES_M, hex_ridership, hex_feature_collection
+from ridership_cube import clean_ridership
 
 def load_and_process_ridership(ridership_file):
     """Load and process ridership data from CSV file."""
     df = pd.read_csv(ridership_file)
+    df['Ridership'] = clean_ridership(df['Ridership'])
     
     # Calculate route-level statistics
     route_stats = df.groupby('Route')['Ridership'].agg(['sum', 'mean', 'count']).reset_index()
@@ -27,47 +31,36 @@ def create_ridership_map(stop_ridership, route_stats, output_file='transit_map.h
                   zoom_start=12,
                   tiles='cartodbpositron')
     
-    # Create color scale for ridership
-    max_riders = stop_ridership['Ridership'].max()
+    # Ridership binned into hexagons at each resolution; the map draws cells, not stop rows
+    cells = hex_ridership(stop_ridership)
+    finest = cells[cells['size_m'] == HEX_SIZES_M[0]]
+
+    # Color by riders per km² so one scale reads the same at every resolution
     colormap = cm.LinearColormap(
         colors=['yellow', 'orange', 'red'],
         vmin=0,
-        vmax=max_riders,
-        caption='Daily Ridership'
+        vmax=finest['per_km2'].max(),
+        caption='Daily Ridership per km²'
     )
     m.add_child(colormap)
-    
-    # Create route groups for organization
-    route_groups = {}
-    for route in stop_ridership['Route'].unique():
-        route_groups[f"Route {route}"] = folium.FeatureGroup(name=f"Route {route}")
-    
-    # Add stops with ridership bubbles, organized by route
-    for _, row in stop_ridership.iterrows():
-        route_group = route_groups[f"Route {row['Route']}"]
-        folium.CircleMarker(
-            location=[row['Lat'], row['Lon']],
-            radius=np.sqrt(row['Ridership']) / 2,  # Scale bubble size
-            popup=(f"Stop: {row['Name']}<br>"
-                  f"Route: {row['Route']}<br>"
-                  f"Ridership: {row['Ridership']}"),
-            color='blue',
-            fill=True,
-            fill_color=colormap(row['Ridership']),
-            fill_opacity=0.7
-        ).add_to(route_group)
-    
-    # Add all route groups to map
-    for group in route_groups.values():
+
+    for size_m, size_cells in cells.groupby('size_m', sort=False):
+        group = folium.FeatureGroup(name=f"Ridership ({size_m:g} m hexagons)", show=size_m == HEX_SIZES_M[0])
+        folium.GeoJson(
+            hex_feature_collection(size_cells, colormap),
+            style_function=lambda feature: {
+                'fillColor': feature['properties']['color'],
+                'color': 'gray',
+                'weight': 1,
+                'fillOpacity': 0.6
+            },
+            tooltip=folium.GeoJsonTooltip(
+                fields=['ridership', 'stops', 'top_routes'],
+                aliases=['Ridership', 'Stops', 'Top routes']
+            )
+        ).add_to(group)
         group.add_to(m)
     
-    # Add heatmap layer
-    heat_data = [[row['Lat'], row['Lon'], row['Ridership']] 
-                 for _, row in stop_ridership.iterrows()]
-    heatmap_group = folium.FeatureGroup(name="Heatmap")
-    plugins.HeatMap(heat_data).add_to(heatmap_group)
-    heatmap_group.add_to(m)
-    
     # Add route statistics to map
     stats_html = "<h4>Route Statistics</h4>"
     stats_html += "<table>"
@@ -6,19 +6,25 @@ from dash import dcc, html
 from dash.dependencies import Input, Output
 import zipfile
 from io import BytesIO
-import base64
-from math import cos, sin, radians
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gtfs_schema import read_gtfs_table, print_memory_report
+from selection_cache import memoize_selection
+from map_layers import add_pie_chart_icons
 import math
 
 # Load GTFS feed data
 def load_gtfs_data(gtfs_zip_path):
     # Read GTFS data
+    memory_report = {}
     with zipfile.ZipFile(gtfs_zip_path, 'r') as gtfs_zip:
-        routes = pd.read_csv(BytesIO(gtfs_zip.read("routes.txt")))
-        shapes = pd.read_csv(BytesIO(gtfs_zip.read("shapes.txt")))
-        trips = pd.read_csv(BytesIO(gtfs_zip.read("trips.txt")))
-        stops = pd.read_csv(BytesIO(gtfs_zip.read("stops.txt")))
-        stop_times = pd.read_csv(BytesIO(gtfs_zip.read("stop_times.txt")))
+        routes = read_gtfs_table(gtfs_zip, "routes", memory_report)
+        shapes = read_gtfs_table(gtfs_zip, "shapes", memory_report)
+        trips = read_gtfs_table(gtfs_zip, "trips", memory_report)
+        stops = read_gtfs_table(gtfs_zip, "stops", memory_report)
+        stop_times = read_gtfs_table(gtfs_zip, "stop_times", memory_report)
+    print_memory_report(memory_report)
 
     print("GTFS Data - Routes, Trips, and Stop Times:")
     print("Routes:", routes.head())
@@ -57,20 +63,6 @@ def process_routes(routes, shapes, trips, stop_times):
 
     return routes, shapes, stops, stop_routes
 
-def create_pie_chart_marker(colors, stop_name):
-    total_slices = len(colors)
-    pie_chart_svg = '<svg width="40" height="40" viewBox="0 0 2 2" xmlns="http://www.w3.org/2000/svg">'
-    angle_step = 360 / total_slices
-    for i, color in enumerate(colors):
-        start_angle = angle_step * i
-        end_angle = angle_step * (i + 1)
-        large_arc_flag = 1 if end_angle - start_angle > 180 else 0
-        path_d = f"M 1 1 L {1 + 1 * cos(radians(start_angle))} {1 + 1 * sin(radians(start_angle))} A 1 1 0 {large_arc_flag} 1 {1 + 1 * cos(radians(end_angle))} {1 + 1 * sin(radians(end_angle))} Z"
-        pie_chart_svg += f'<path d="{path_d}" fill="{color}" stroke="black" stroke-width="0.05"/>'
-    pie_chart_svg += '</svg>'
-    encoded_svg = base64.b64encode(pie_chart_svg.encode('utf-8')).decode('utf-8')
-    return f'<img src="data:image/svg+xml;base64,{encoded_svg}" alt="{stop_name}" width="40" height="40">'
-
 def create_map(routes, shapes, stops, stop_routes, ridership_df, active_routes=None):
     if active_routes is None:
         active_routes = ["1"]  # Default to showing Route 1
@@ -114,6 +106,7 @@ def create_map(routes, shapes, stops, stop_routes, ridership_df, active_routes=N
     route_colors = routes.set_index('route_id')['route_color'].to_dict()
 
     transit_map = folium.Map(location=[37.7749, -122.4194], zoom_start=13)
+    pie_icons = add_pie_chart_icons(transit_map)
     bounds = []
 
     # Add stops to the map
@@ -133,14 +126,9 @@ def create_map(routes, shapes, stops, stop_routes, ridership_df, active_routes=N
         # Create transfer station only if multiple active routes use the stop
         if len(stop_colors) > 1:
             # Create pie chart marker for transfer points
-            icon_html = create_pie_chart_marker(stop_colors, stop['stop_name'])
             marker = folium.Marker(
                 location=[stop['stop_lat'], stop['stop_lon']],
-                icon=folium.DivIcon(
-                    html=icon_html, 
-                    icon_size=(marker_size*2, marker_size*2),
-                    icon_anchor=(marker_size, marker_size)
-                ),
+                icon=pie_icons.icon(stop_colors, marker_size*2),
                 tooltip=f"Transfer Station: {stop['stop_name']} (Ridership: {stop_ridership})"
             )
         else:
@@ -177,8 +165,14 @@ def create_map(routes, shapes, stops, stop_routes, ridership_df, active_routes=N
     return transit_map
 
 # Generate the app
-def generate_app(routes, shapes, stops, stop_routes, ridership_df, map_file):
+def generate_app(routes, shapes, stops, stop_routes, ridership_df):
     app = dash.Dash(__name__)
+
+    # Pages are rendered in memory and memoized per route selection
+    def render_html(active_routes):
+        return create_map(routes, shapes, stops, stop_routes, ridership_df, active_routes=active_routes).get_root().render()
+
+    render = memoize_selection(render_html)
     route_options = [{"label": f"Route {route_id}", "value": route_id} for route_id in routes['route_id'].unique()]
 
     app.layout = html.Div([
@@ -189,7 +183,7 @@ def generate_app(routes, shapes, stops, stop_routes, ridership_df, map_file):
             value=["1"],
             inline=True
         ),
-        html.Iframe(id="map", srcDoc=open(map_file, "r").read(), width="100%", height="600")
+        html.Iframe(id="map", srcDoc=render(["1"]), width="100%", height="600")
     ])
 
     @app.callback(
@@ -197,9 +191,7 @@ def generate_app(routes, shapes, stops, stop_routes, ridership_df, map_file):
         Input("route-selector", "value")
     )
     def update_map(selected_routes):
-        updated_map = create_map(routes, shapes, stops, stop_routes, ridership_df, active_routes=selected_routes)
-        updated_map.save(map_file)
-        return open(map_file, "r").read()
+        return render(selected_routes)
 
     return app
 
@@ -215,11 +207,6 @@ if __name__ == "__main__":
     # Load ridership data
     ridership_df = load_ridership_data(ridership_path)
 
-    # Create the initial map with Route 1 visible
-    map_file = "transit_map.html"
-    base_map = create_map(routes, shapes, stops, stop_routes, ridership_df, active_routes=["1"])
-    base_map.save(map_file)
-
     # Run the Dash app
-    app = generate_app(routes, shapes, stops, stop_routes, ridership_df, map_file)
+    app = generate_app(routes, shapes, stops, stop_routes, ridership_df)
     app.run_server(debug=True)
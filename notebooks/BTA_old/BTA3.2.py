@@ -6,19 +6,26 @@ from dash import dcc, html
 from dash.dependencies import Input, Output
 import zipfile
 from io import BytesIO
-import base64
-from math import cos, sin, radians
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gtfs_schema import read_gtfs_table, print_memory_report
+from selection_cache import memoize_selection
+from map_layers import add_pie_chart_icons
+from ridership_cube import build_ridership_cube, selection_ridership
 import math
 
 # Load GTFS feed data
 def load_gtfs_data(gtfs_zip_path):
     # Read GTFS data
+    memory_report = {}
     with zipfile.ZipFile(gtfs_zip_path, 'r') as gtfs_zip:
-        routes = pd.read_csv(BytesIO(gtfs_zip.read("routes.txt")))
-        shapes = pd.read_csv(BytesIO(gtfs_zip.read("shapes.txt")))
-        trips = pd.read_csv(BytesIO(gtfs_zip.read("trips.txt")))
-        stops = pd.read_csv(BytesIO(gtfs_zip.read("stops.txt")))
-        stop_times = pd.read_csv(BytesIO(gtfs_zip.read("stop_times.txt")))
+        routes = read_gtfs_table(gtfs_zip, "routes", memory_report)
+        shapes = read_gtfs_table(gtfs_zip, "shapes", memory_report)
+        trips = read_gtfs_table(gtfs_zip, "trips", memory_report)
+        stops = read_gtfs_table(gtfs_zip, "stops", memory_report)
+        stop_times = read_gtfs_table(gtfs_zip, "stop_times", memory_report)
+    print_memory_report(memory_report)
 
     print("GTFS Data - Routes, Trips, and Stop Times:")
     print("Routes:", routes.head())
@@ -58,54 +65,31 @@ def process_routes(routes, shapes, trips, stop_times):
 
     return routes, shapes, stops, stop_routes
 
-def create_pie_chart_marker(colors, stop_name):
-    total_slices = len(colors)
-    pie_chart_svg = '<svg width="40" height="40" viewBox="0 0 2 2" xmlns="http://www.w3.org/2000/svg">'
-    angle_step = 360 / total_slices
-    for i, color in enumerate(colors):
-        start_angle = angle_step * i
-        end_angle = angle_step * (i + 1)
-        large_arc_flag = 1 if end_angle - start_angle > 180 else 0
-        path_d = f"M 1 1 L {1 + 1 * cos(radians(start_angle))} {1 + 1 * sin(radians(start_angle))} A 1 1 0 {large_arc_flag} 1 {1 + 1 * cos(radians(end_angle))} {1 + 1 * sin(radians(end_angle))} Z"
-        pie_chart_svg += f'<path d="{path_d}" fill="{color}" stroke="black" stroke-width="0.05"/>'
-    pie_chart_svg += '</svg>'
-    encoded_svg = base64.b64encode(pie_chart_svg.encode('utf-8')).decode('utf-8')
-    return f'<img src="data:image/svg+xml;base64,{encoded_svg}" alt="{stop_name}" width="40" height="40">'
-
-def create_map(routes, shapes, stops, stop_routes, ridership_df, active_routes=None):
+def create_map(routes, shapes, stops, stop_routes, ridership_cube, active_routes=None):
     if active_routes is None:
         active_routes = ["1"]  # Default to showing Route 1
 
     # Normalize stop_id as string for all DataFrames
     stops['stop_id'] = stops['stop_id'].astype(str)
     stop_routes['stop_id'] = stop_routes['stop_id'].astype(str)
-    ridership_df['Stop'] = ridership_df['Stop'].astype(str)
 
-    # Filter stops for active routes only
-    active_stop_ids = stop_routes[stop_routes['route_id'].isin(active_routes)]['stop_id'].unique()
-    active_stops = stops[stops['stop_id'].isin(active_stop_ids)].copy()
+    # Filter stops for active routes only; each stop's active routes in order of appearance
+    active_pairs = stop_routes[stop_routes['route_id'].isin(active_routes)]
+    routes_at_stop = active_pairs.groupby('stop_id', sort=False)['route_id'].unique()
+    active_stops = stops[stops['stop_id'].isin(routes_at_stop.index)].copy()
 
     # Debugging output
     print("Active Routes:", active_routes)
-    print("Unique Stop IDs for Active Routes:", active_stop_ids)
+    print("Unique Stop IDs for Active Routes:", routes_at_stop.index.to_numpy())
     print("Active Stops after Filtering:")
     print(active_stops.head())
 
-    # Aggregate ridership for each stop across active routes
-    stop_ridership = ridership_df[ridership_df['Route'].isin(active_routes)].groupby(['Stop'])['Ridership'].sum().reset_index()
-
-    # Debugging aggregated ridership
-    print("Aggregated Ridership for Active Routes:")
-    print(stop_ridership.head())
-
-    # Merge active stops with ridership data
-    active_stops = active_stops.merge(
-        stop_ridership, 
-        left_on='stop_id', 
-        right_on='Stop', 
-        how='left'
-    )
-    active_stops['Ridership'] = active_stops['Ridership'].fillna(0)
+    # Total and per-route ridership at every stop for the selection, sliced from the cube
+    stop_totals, by_route = selection_ridership(ridership_cube, active_routes)
+    active_stops['Ridership'] = stop_totals.reindex(active_stops['stop_id'], fill_value=0).to_numpy()
+    route_lines = pd.Series([f"Route {route_id}: {ridership}" for route_id, ridership in zip(by_route['route'], by_route['ridership'])],
+                            index=by_route.index, dtype=object)
+    route_details = route_lines.groupby(by_route['stop'].to_numpy(), sort=False).agg("<br>".join)
 
     # Debugging post-merge active stops
     print("Active Stops after Merging with Ridership:")
@@ -115,50 +99,31 @@ def create_map(routes, shapes, stops, stop_routes, ridership_df, active_routes=N
     route_colors = routes.set_index('route_id')['route_color'].to_dict()
 
     transit_map = folium.Map(location=[37.7749, -122.4194], zoom_start=13)
+    pie_icons = add_pie_chart_icons(transit_map)
     bounds = []
 
     # Add stops to the map
     for _, stop in active_stops.iterrows():
         # Get the route colors for the stop that are currently active
-        stop_route_ids = stop_routes[
-            (stop_routes['stop_id'] == stop['stop_id']) & 
-            (stop_routes['route_id'].isin(active_routes))
-        ]['route_id'].unique()
-        
-        stop_colors = ["#" + route_colors.get(route_id, "000000") for route_id in stop_route_ids]
+        stop_colors = ["#" + route_colors.get(route_id, "000000") for route_id in routes_at_stop[stop['stop_id']]]
 
         # Calculate marker size based on ridership (scale ridership logarithmically)
         stop_ridership = stop['Ridership']
         marker_size = max(8, min(25, 8 + int(math.log(stop_ridership + 1) * 3)))
 
-        # Compute ridership for each selected route
-        route_ridership = ridership_df[
-            (ridership_df['Stop'] == stop['stop_id']) &
-            (ridership_df['Route'].isin(active_routes))
-        ].groupby('Route')['Ridership'].sum()
-
         # Create the tooltip details
-        total_ridership = route_ridership.sum()
-        route_ridership_details = "<br>".join(
-            [f"Route {route_id}: {ridership}" for route_id, ridership in route_ridership.items()]
-        )
         tooltip_text = (
             f"Transfer Station: {stop['stop_name']}<br>"
-            f"Total Ridership: {total_ridership}<br>"
-            f"{route_ridership_details}"
+            f"Total Ridership: {stop_ridership}<br>"
+            f"{route_details.get(stop['stop_id'], '')}"
         )
 
         # Create transfer station only if multiple active routes use the stop
         if len(stop_colors) > 1:
             # Create pie chart marker for transfer points
-            icon_html = create_pie_chart_marker(stop_colors, stop['stop_name'])
             marker = folium.Marker(
                 location=[stop['stop_lat'], stop['stop_lon']],
-                icon=folium.DivIcon(
-                    html=icon_html, 
-                    icon_size=(marker_size*2, marker_size*2),
-                    icon_anchor=(marker_size, marker_size)
-                ),
+                icon=pie_icons.icon(stop_colors, marker_size*2),
                 tooltip=tooltip_text
             )
         else:
@@ -195,8 +160,14 @@ def create_map(routes, shapes, stops, stop_routes, ridership_df, active_routes=N
     return transit_map
 
 # Generate the app
-def generate_app(routes, shapes, stops, stop_routes, ridership_df, map_file):
+def generate_app(routes, shapes, stops, stop_routes, ridership_cube):
     app = dash.Dash(__name__)
+
+    # Pages are rendered in memory and memoized per route selection
+    def render_html(active_routes):
+        return create_map(routes, shapes, stops, stop_routes, ridership_cube, active_routes=active_routes).get_root().render()
+
+    render = memoize_selection(render_html)
     route_options = [{"label": f"Route {route_id}", "value": route_id} for route_id in routes['route_id'].unique()]
 
     app.layout = html.Div([
@@ -207,7 +178,7 @@ def generate_app(routes, shapes, stops, stop_routes, ridership_df, map_file):
             value=["1"],
             inline=True
         ),
-        html.Iframe(id="map", srcDoc=open(map_file, "r").read(), width="100%", height="600")
+        html.Iframe(id="map", srcDoc=render(["1"]), width="100%", height="600")
     ])
 
     @app.callback(
@@ -215,9 +186,7 @@ def generate_app(routes, shapes, stops, stop_routes, ridership_df, map_file):
         Input("route-selector", "value")
     )
     def update_map(selected_routes):
-        updated_map = create_map(routes, shapes, stops, stop_routes, ridership_df, active_routes=selected_routes)
-        updated_map.save(map_file)
-        return open(map_file, "r").read()
+        return render(selected_routes)
 
     return app
 
@@ -232,12 +201,8 @@ if __name__ == "__main__":
 
     # Load ridership data
     ridership_df = load_ridership_data(ridership_path)
-
-    # Create the initial map with Route 1 visible
-    map_file = "transit_map.html"
-    base_map = create_map(routes, shapes, stops, stop_routes, ridership_df, active_routes=["1"])
-    base_map.save(map_file)
+    ridership_cube = build_ridership_cube(ridership_df)
 
     # Run the Dash app
-    app = generate_app(routes, shapes, stops, stop_routes, ridership_df, map_file)
+    app = generate_app(routes, shapes, stops, stop_routes, ridership_cube)
     app.run_server(debug=True)
@@ -1,6 +1,9 @@
 import os
 import folium
 import gtfs_kit as gk
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from feed_cache import load_feed_cached
 import pandas as pd
 import argparse
 from shapely.geometry import LineString
@@ -20,7 +23,7 @@ class TransitMapApp:
             if filename.endswith('.zip'):
                 feed_path = os.path.join(folder_path, filename)
                 try:
-                    feed = gk.read_feed(feed_path, dist_units='km')
+                    feed = gk.Feed(dist_units='km', **load_feed_cached(feed_path))
                     self.gtfs_feeds[filename] = feed
                     print(f"✅ Loaded GTFS feed: {filename}")
                 except Exception as e:
@@ -1,32 +1,19 @@
-import gtfs_kit as gk
 import networkx as nx
 import geopandas as gpd
 import shapely.geometry
 import pandas as pd
 import os
-from datetime import datetime
+from types import SimpleNamespace
+from regional_feed import build_regional_feed
+from isochrone_polygons import DEFAULT_BANDS, isochrone_polygons, export_isochrone_geojson
 
 def load_gtfs_from_folder(folder_path):
-    feeds = []
-    for file_name in os.listdir(folder_path):
-        if file_name.endswith('.zip'):
-            feed_path = os.path.join(folder_path, file_name)
-            feed = gk.read_feed(feed_path, dist_units='km')
-            feeds.append(feed)
-    return feeds
+    """Merged regional tables with agency-prefixed IDs (see regional_feed.py)."""
+    return build_regional_feed(folder_path)
 
 def merge_schedules(feeds):
-    merged_schedule = feeds[0]
-    for feed in feeds[1:]:
-        merged_schedule.stops = pd.concat([merged_schedule.stops, feed.stops])
-        merged_schedule.trips = pd.concat([merged_schedule.trips, feed.trips])
-        merged_schedule.stop_times = pd.concat([merged_schedule.stop_times, feed.stop_times])
-        merged_schedule.routes = pd.concat([merged_schedule.routes, feed.routes])
-        merged_schedule.calendar = pd.concat([merged_schedule.calendar, feed.calendar])
-    return merged_schedule
-
-def parse_time(time_str):
-    return datetime.strptime(time_str, '%H:%M:%S').time()
+    """Exposes the merged tables as schedule attributes (schedule.stops, schedule.trips, ...)."""
+    return SimpleNamespace(**feeds)
 
 def create_network(schedule):
     graph = nx.DiGraph()
@@ -36,10 +23,9 @@ def create_network(schedule):
         for i in range(len(trip_stops) - 1):
             stop_from = trip_stops.iloc[i]
             stop_to = trip_stops.iloc[i + 1]
-            departure_time = parse_time(stop_from.departure_time)
-            arrival_time = parse_time(stop_to.arrival_time)
-            travel_time = (datetime.combine(datetime.min, arrival_time) - datetime.combine(datetime.min, departure_time)).total_seconds() / 60
-            if travel_time > 0:
+            # Times are int seconds after midnight (see gtfs_schema.py)
+            travel_time = (stop_to.arrival_time - stop_from.departure_time) / 60
+            if pd.notna(travel_time) and travel_time > 0:
                 graph.add_edge(stop_from.stop_id, stop_to.stop_id, weight=travel_time)
     return graph
 
@@ -65,3 +51,8 @@ isochrone = calculate_isochrone(network, origin, travel_time)
 isochrone_stops = visualize_isochrone(isochrone, combined_schedule)
 
 print(isochrone_stops)
+
+# Filled reachability areas for the folium maps, in bands that stop at the Dijkstra cutoff
+bands = [band for band in DEFAULT_BANDS if band < travel_time] + [travel_time]
+isochrone_bands = isochrone_polygons(isochrone, combined_schedule.stops, bands)
+export_isochrone_geojson(isochrone_bands, 'isochrones.geojson')
@@ -1,6 +1,7 @@
 import os
 import folium
 import gtfs_kit as gk
+from feed_cache import load_feed_cached
 import pandas as pd
 import argparse
 from shapely.geometry import LineString
@@ -26,7 +27,7 @@ class TransitMapApp:
             if filename.endswith('.zip'):
                 feed_path = os.path.join(folder_path, filename)
                 try:
-                    feed = gk.read_feed(feed_path, dist_units='km')
+                    feed = gk.Feed(dist_units='km', **load_feed_cached(feed_path))
                     agency_name = feed.agency.agency_name.iloc[0] if not feed.agency.empty else filename
                     self.gtfs_feeds[agency_name] = feed
                     print(f"✅ Loaded GTFS feed: {agency_name}")
@@ -1,152 +1,193 @@
 import pandas as pd
 import folium
-from folium import FeatureGroup
 import dash
 from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 import zipfile
 from io import BytesIO
 import os
+import json
+import time
+import fcntl
+import hashlib
+from feed_cache import feeds_fingerprint
+from regional_feed import build_regional_feed
+from gtfs_schema import read_gtfs_table
+from route_index import build_shape_coords, build_stop_route_index, filter_stop_route_index
+from map_layers import (FRAGMENT_CACHE_DIR, RouteSelection, TransitGeoJson, add_transit_style,
+                        load_cached_fragment, route_properties, save_fragment, stop_properties)
+from shape_simplify import add_significance, simplify_shapes, simplification_report, print_simplification_report, level_for_zoom
+
+SHAPE_DETAIL_ZOOM = 15  # Shapes are simplified to stay under half a pixel up to this zoom
+ROUTE_GROUP = "regional"  # Route layers and the stop layer that follows them
+VIEWER_VERSION = 2  # Bump whenever build_viewer's output changes
 
 # Load GTFS feed data from a single zip file
 def load_single_gtfs_data(gtfs_zip_path):
     with zipfile.ZipFile(gtfs_zip_path, 'r') as gtfs_zip:
-        routes = pd.read_csv(BytesIO(gtfs_zip.read("routes.txt")), dtype={"route_id": str})
-        shapes = pd.read_csv(BytesIO(gtfs_zip.read("shapes.txt")), dtype={"shape_id": str, "shape_pt_lat": float, "shape_pt_lon": float})
-        trips = pd.read_csv(BytesIO(gtfs_zip.read("trips.txt")), dtype={"route_id": str, "trip_id": str, "shape_id": str})
-        stops = pd.read_csv(BytesIO(gtfs_zip.read("stops.txt")), dtype={"stop_id": str, "stop_lat": float, "stop_lon": float})
-        stop_times = pd.read_csv(BytesIO(gtfs_zip.read("stop_times.txt")), dtype={"trip_id": str, "stop_id": str})
+        routes = read_gtfs_table(gtfs_zip, "routes")
+        shapes = read_gtfs_table(gtfs_zip, "shapes")
+        trips = read_gtfs_table(gtfs_zip, "trips")
+        stops = read_gtfs_table(gtfs_zip, "stops")
+        stop_times = read_gtfs_table(gtfs_zip, "stop_times")
 
     return routes, shapes, trips, stops, stop_times
 
 # Load GTFS data from all zip files in a folder
 def load_gtfs_from_folder(folder_path):
-    all_routes, all_shapes, all_trips, all_stops, all_stop_times = [], [], [], [], []
-
-    for file_name in os.listdir(folder_path):
-        if file_name.endswith('.zip'):
-            gtfs_zip_path = os.path.join(folder_path, file_name)
-            routes, shapes, trips, stops, stop_times = load_single_gtfs_data(gtfs_zip_path)
-
-            all_routes.append(routes)
-            all_shapes.append(shapes)
-            all_trips.append(trips)
-            all_stops.append(stops)
-            all_stop_times.append(stop_times)
-
-    # Concatenate all dataframes
-    routes = pd.concat(all_routes, ignore_index=True).drop_duplicates()
-    shapes = pd.concat(all_shapes, ignore_index=True).drop_duplicates()
-    trips = pd.concat(all_trips, ignore_index=True).drop_duplicates()
-    stops = pd.concat(all_stops, ignore_index=True).drop_duplicates()
-    stop_times = pd.concat(all_stop_times, ignore_index=True).drop_duplicates()
-
-    return routes, shapes, trips, stops, stop_times
+    # Agency-prefixed IDs keep feeds from colliding, so no dedupe pass is needed
+    feed = build_regional_feed(folder_path, tables=['routes', 'shapes', 'trips', 'stops', 'stop_times'])
+    return feed['routes'], feed['shapes'], feed['trips'], feed['stops'], feed['stop_times']
 
 # Process data
-def process_routes(routes, shapes, trips, stop_times):
+def process_routes(routes, shapes, trips, stops, stop_times):
     # Normalize IDs to strings
     routes['route_id'] = routes['route_id'].astype(str)
     trips['route_id'] = trips['route_id'].astype(str)
     stop_times['stop_id'] = stop_times['stop_id'].astype(str)
 
+    # Drop shape vertices that can't be seen at the map's detail zoom
+    level = level_for_zoom(SHAPE_DETAIL_ZOOM, stops['stop_lat'].mean())
+    shapes = add_significance(shapes)
+    agencies = shapes['shape_id'].astype(str).str.split(':').str[0]
+    print_simplification_report(simplification_report(shapes, level, agencies), level)
+    shapes = simplify_shapes(shapes, level)
+
     # Map route_id to shapes
     route_shapes = trips[['route_id', 'shape_id']].drop_duplicates()
     routes = routes.merge(route_shapes, on='route_id')
 
-    # Associate stops with routes
-    stop_routes = trips[['route_id', 'trip_id']].merge(stop_times[['trip_id', 'stop_id']], on='trip_id')
-    stop_routes = stop_routes.drop_duplicates()
+    # Associate stops with routes, keyed by physical stop (shared stops of different agencies are one cluster)
+    stop_routes = trips[['route_id', 'trip_id']].merge(stop_times[['trip_id', 'stop_id']].drop_duplicates(), on='trip_id')
+    cluster_of = stops.drop_duplicates('stop_id').set_index(stops['stop_id'].astype(str).drop_duplicates())['stop_cluster_id']
+    stop_routes = pd.DataFrame({
+        'stop_id': cluster_of.reindex(stop_routes['stop_id'].astype(str)).to_numpy(dtype=object),
+        'route_id': stop_routes['route_id'].to_numpy(dtype=object)
+    }).dropna()
+
+    # Inverted index built once; stops come back as one row per physical stop in index order
+    stop_routes = build_stop_route_index(stop_routes)
+    stops = (stops.drop_duplicates('stop_cluster_id').set_index('stop_cluster_id')
+             .reindex(stop_routes['stop_ids']).reset_index())
 
     return routes, shapes, stops, stop_routes
 
-def create_map(routes, shapes, stops, stop_routes, active_routes=None):
-    if active_routes is None:
-        active_routes = ["1"]  # Default to showing Route 1
-
-    # Normalize stop_id as string for all DataFrames
-    stops['stop_id'] = stops['stop_id'].astype(str)
-    stop_routes['stop_id'] = stop_routes['stop_id'].astype(str)
-
-    # Filter stops for active routes only
-    active_stop_ids = stop_routes[stop_routes['route_id'].isin(active_routes)]['stop_id'].unique()
-    active_stops = stops[stops['stop_id'].isin(active_stop_ids)].copy()
-
-    # Assign colors based on GTFS feed
-    route_colors = routes.set_index('route_id')['route_color'].to_dict()
-
-    transit_map = folium.Map(location=[37.7749, -122.4194], zoom_start=13)
-    bounds = []
-
-    # Add stops to the map
-    for _, stop in active_stops.iterrows():
-        # Get the route colors for the stop that are currently active
-        stop_route_ids = stop_routes[
-            (stop_routes['stop_id'] == stop['stop_id']) & 
-            (stop_routes['route_id'].isin(active_routes))
-        ]['route_id'].unique()
-        
-        stop_colors = ["#" + str(route_colors.get(route_id, "000000")) for route_id in stop_route_ids]
-
-        # Create the tooltip details
-        tooltip_text = f"{stop['stop_name']}"
-
-        color = stop_colors[0] if stop_colors else "#000000"
-        marker = folium.CircleMarker(
-            location=[stop['stop_lat'], stop['stop_lon']],
-            radius=8,  # Fixed marker size
-            color=color,
-            fill=True,
-            fill_color=color,
-            fill_opacity=0.7,
-            tooltip=tooltip_text
-        )
-
-        marker.add_to(transit_map)
-
-    # Add routes to the map (existing code remains the same)
-    for route_id in active_routes:
-        color = "#" + str(route_colors.get(route_id, "000000"))
-        group = FeatureGroup(name=f"Route {route_id}", control=True)
-
-        for shape_id in routes[routes['route_id'] == route_id]['shape_id']:
-            shape_points = shapes[shapes['shape_id'] == shape_id][['shape_pt_lat', 'shape_pt_lon']].values.tolist()
-            polyline = folium.PolyLine(locations=shape_points, color=color, weight=3, opacity=0.8)
-            polyline.add_to(group)
-            bounds.extend(shape_points)
-
-        group.add_to(transit_map)
-
-    folium.LayerControl().add_to(transit_map)
-    if bounds:
-        transit_map.fit_bounds(bounds)
-
-    return transit_map
+def precompute_route_features(routes, shapes):
+    """route_id -> its GeoJSON Feature (every shape of the route), shipped to the browser once."""
+    shape_coords = build_shape_coords(shapes)
+    features = {}
+    for route_id, group in routes.groupby('route_id', sort=False):
+        lines = [shape_coords[shape_id][:, ::-1].round(6).tolist()
+                 for shape_id in group['shape_id'] if shape_id in shape_coords]
+        if not lines:
+            continue
+        route = next(group.itertuples(index=False))
+        color = "#" + str(route.route_color if pd.notna(route.route_color) else "000000")
+        features[route_id] = {
+            "type": "Feature",
+            "properties": route_properties(route, route.feed, f"Route {route_id}", color),
+            "geometry": {"type": "MultiLineString", "coordinates": lines}
+        }
+    return features
+
+def stop_feature_collection(stops, stop_routes, route_features):
+    """Each physical stop once, with every route serving it; coloured by the first of those routes."""
+    positions, served = filter_stop_route_index(stop_routes, stop_routes['route_ids'])
+    features = []
+    for stop, route_ids in zip(stops.iloc[positions].itertuples(index=False), served):
+        if pd.isna(stop.stop_lat) or pd.isna(stop.stop_lon):
+            continue
+        first = route_features.get(route_ids[0])
+        color = first['properties']['color'] if first else "#000000"
+        features.append({
+            "type": "Feature",
+            "properties": stop_properties(stop, list(route_ids), color),
+            "geometry": {"type": "Point", "coordinates": [round(float(stop.stop_lon), 6), round(float(stop.stop_lat), 6)]}
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+def create_map(stop_collection):
+    """The page rendered once: every stop, shown while a selected route serves it, and no routes;
+    the browser adds routes through transitShowRoutes."""
+    transit_map = folium.Map(location=[40.4406, -79.9959], zoom_start=10, prefer_canvas=True)
+    add_transit_style(transit_map)
+    RouteSelection(ROUTE_GROUP).add_to(transit_map)
+    TransitGeoJson(stop_collection, name="Stops", stops_of=ROUTE_GROUP).add_to(transit_map)
+    return transit_map.get_root().render()
+
+def build_viewer(routes, shapes, stops, stop_routes):
+    """(map page HTML, route_id -> GeoJSON Feature): everything the viewer sends, built once."""
+    start = time.perf_counter()
+    route_features = precompute_route_features(routes, shapes)
+    page = create_map(stop_feature_collection(stops, stop_routes, route_features))
+    print(f"🧩 Built viewer with {len(route_features)} routes ({time.perf_counter() - start:.1f}s)")
+    return page, route_features
+
+def viewer_cache_path(folder_path, cache_dir=FRAGMENT_CACHE_DIR):
+    """Where the built viewer for these feeds lives in the shared fragment cache."""
+    params = {'feeds': feeds_fingerprint(folder_path), 'zoom': SHAPE_DETAIL_ZOOM, 'version': VIEWER_VERSION}
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return os.path.join(cache_dir, "regionwide", f"{key}.json")
+
+def load_viewer(folder_path, cache_dir=FRAGMENT_CACHE_DIR):
+    """{route_ids, page, routes} for the viewer, read from the shared on-disk cache or built once on a miss.
+
+    A file lock makes concurrent processes (e.g. gunicorn workers started without --preload)
+    wait for one build instead of each building; older builds are evicted when a new one is saved.
+    """
+    path = viewer_cache_path(folder_path, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, "regionwide.lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        viewer = load_cached_fragment(path)
+        if viewer is None:
+            routes, shapes, trips, stops, stop_times = load_gtfs_from_folder(folder_path)
+            routes, shapes, stops, stop_routes = process_routes(routes, shapes, trips, stops, stop_times)
+            page, route_features = build_viewer(routes, shapes, stops, stop_routes)
+            viewer = {'route_ids': list(routes['route_id'].unique()), 'page': page, 'routes': route_features}
+            save_fragment(path, viewer)
+            print(f"💾 Viewer cached: {path}")
+        else:
+            print(f"⚡ Viewer loaded from cache: {path}")
+    return viewer
 
 # Generate the app
-def generate_app(routes, shapes, stops, stop_routes, map_file):
+def generate_app(route_ids, page, route_features, default_routes):
     app = dash.Dash(__name__)
-    route_options = [{"label": f"Route {route_id}", "value": route_id} for route_id in routes['route_id'].unique()]
+    route_options = [{"label": f"Route {route_id}", "value": route_id} for route_id in route_ids]
 
+    # The route GeoJSON ships once in the store; toggling runs in the browser with no server round trip
     app.layout = html.Div([
         html.H1("GTFS Route Viewer"),
         dcc.Checklist(
             id="route-selector",
             options=route_options,
-            value=["1"],
+            value=default_routes,
             inline=True
         ),
-        html.Iframe(id="map", srcDoc=open(map_file, "r").read(), width="100%", height="600")
+        dcc.Store(id="route-geojson", data=route_features),
+        html.Div(id="route-status"),
+        html.Iframe(id="map", srcDoc=page, width="100%", height="600")
     ])
 
-    @app.callback(
-        Output("map", "srcDoc"),
-        Input("route-selector", "value")
+    app.clientside_callback(
+        """
+        function(selected, routes) {
+            selected = selected || [];
+            var frame = document.getElementById("map");
+            var show = function() { frame.contentWindow.transitShowRoutes(routes, selected); };
+            if (frame.contentWindow && frame.contentWindow.transitShowRoutes) {
+                show();
+            } else {
+                frame.addEventListener("load", show, {once: true});  // Map page still loading
+            }
+            return selected.length + " of " + Object.keys(routes).length + " routes shown";
+        }
+        """,
+        Output("route-status", "children"),
+        Input("route-selector", "value"),
+        State("route-geojson", "data")
     )
-    def update_map(selected_routes):
-        updated_map = create_map(routes, shapes, stops, stop_routes, active_routes=selected_routes)
-        updated_map.save(map_file)
-        return open(map_file, "r").read()
 
     return app
 
@@ -154,15 +195,10 @@ def generate_app(routes, shapes, stops, stop_routes, map_file):
 if __name__ == "__main__":
     gtfs_folder_path = "notebooks/Regional GTFS"  # Update this path to your GTFS folder
 
-    # Load and process GTFS data
-    routes, shapes, trips, stops, stop_times = load_gtfs_from_folder(gtfs_folder_path)
-    routes, shapes, stops, stop_routes = process_routes(routes, shapes, trips, stop_times)
-
-    # Create the initial map with Route 1 visible
-    map_file = "transit_map.html"
-    base_map = create_map(routes, shapes, stops, stop_routes, active_routes=["1"])
-    base_map.save(map_file)
+    # Build the page and route data once (or read them from the cache); the browser does all toggling
+    viewer = load_viewer(gtfs_folder_path)
+    default_routes = viewer['route_ids'][:1]
 
-    # Run the Dash app
-    app = generate_app(routes, shapes, stops, stop_routes, map_file)
+    # Run the Dash app (for production, serve viewer_wsgi.py with gunicorn)
+    app = generate_app(viewer['route_ids'], viewer['page'], viewer['routes'], default_routes)
     app.run_server(debug=True)
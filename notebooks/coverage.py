@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from feed_cache import CACHE_DIR, zip_content_hash
+from isochrone_polygons import to_metric, to_lat_lon
+from regional_feed import connected_components
+
+WALK_RADIUS_M = 400
+QUAD_SEGS = 8  # Buffer circles have 4 * QUAD_SEGS sides (area within 1% of a true circle)
+SYSTEM = 'system'
+
+# Coverage tables live in cache/coverage/<feed name>/<key>.parquet
+COVERAGE_CACHE_DIR = os.path.join(os.path.dirname(CACHE_DIR), "coverage")
+COVERAGE_VERSION = 1  # Bump whenever coverage_table's output changes
+
+def dissolve(x, y, radius_m=WALK_RADIUS_M):
+    """Union of radius_m circles around metric points: (dissolved geometry, summed circle area).
+
+    Only circles that overlap need merging, so an STRtree splits the points into chains of
+    overlapping circles and each chain is unioned on its own; the chains are disjoint.
+    """
+    points = shapely.points(x, y)
+    buffers = shapely.buffer(points, radius_m, quad_segs=QUAD_SEGS)
+    a, b = shapely.STRtree(points).query(points, predicate='dwithin', distance=2 * radius_m)
+    labels = connected_components(len(points), a, b)
+
+    order = np.argsort(labels, kind='stable')
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+    parts = [shapely.union_all(buffers[chain]) for chain in np.split(order, boundaries)]
+    return shapely.multipolygons(shapely.get_parts(parts)), float(shapely.area(buffers).sum())
+
+def _to_lat_lon_geometry(geometry, origin):
+    """Metric geometry back to lon/lat coordinates for mapping."""
+    def transform(coords):
+        lat, lon = to_lat_lon(coords[:, 0], coords[:, 1], *origin)
+        return np.column_stack([lon, lat])
+    return shapely.transform(geometry, transform)
+
+def coverage_table(stops, pairs, routes=None, radius_m=WALK_RADIUS_M):
+    """Dissolved walk coverage per route, per agency (routes' merged-feed key or agency_id) and for the whole system.
+
+    pairs are (stop_id, route_id) pairs as from transfers.stop_route_pairs. One row per group:
+    level ('route' / 'agency' / 'system'), group, stops, covered_km2, buffer_km2 (the circles'
+    summed area), overlap (share of circle area that double-counts ground) and the dissolved
+    geometry in lon/lat.
+    """
+    located = stops.drop_duplicates('stop_id').dropna(subset=['stop_lat', 'stop_lon'])
+    located = located.set_index(located['stop_id'].to_numpy(dtype=object))
+    origin = (located['stop_lat'].mean(), located['stop_lon'].mean())
+    x, y = to_metric(located['stop_lat'].to_numpy(), located['stop_lon'].to_numpy(), *origin)
+    position = pd.Series(np.arange(len(located)), index=located.index)
+
+    pairs = pairs[pairs['stop_id'].isin(located.index)]
+    groups = [('route', pairs[['route_id', 'stop_id']].rename(columns={'route_id': 'group'}))]
+    agency_column = next((column for column in ('feed', 'agency_id') if routes is not None and column in routes.columns), None)
+    if agency_column:
+        agency_of = pd.Series(routes[agency_column].to_numpy(dtype=object), index=routes['route_id'].astype(str).to_numpy())
+        agencies = pd.DataFrame({'group': agency_of.reindex(pairs['route_id']).to_numpy(), 'stop_id': pairs['stop_id'].to_numpy()})
+        groups.append(('agency', agencies.dropna().drop_duplicates()))
+    groups.append((SYSTEM, pd.DataFrame({'group': SYSTEM, 'stop_id': pairs['stop_id'].unique()})))
+
+    rows = []
+    for level, members in groups:
+        for group, stop_ids in members.groupby('group', sort=True)['stop_id']:
+            index = position.reindex(stop_ids.unique()).to_numpy()
+            geometry, buffer_area = dissolve(x[index], y[index], radius_m)
+            covered = shapely.area(geometry)
+            rows.append({
+                'level': level,
+                'group': str(group),
+                'stops': len(index),
+                'covered_km2': round(covered / 1e6, 3),
+                'buffer_km2': round(buffer_area / 1e6, 3),
+                'overlap': round(1 - covered / buffer_area, 3) if buffer_area else 0.0,
+                'geometry': _to_lat_lon_geometry(geometry, origin)
+            })
+    return pd.DataFrame(rows)
+
+def coverage_key(feed_path, radius_m):
+    """Cache key: the feed's content plus everything that changes the coverage."""
+    params = {'feed': zip_content_hash(feed_path), 'radius_m': radius_m, 'version': COVERAGE_VERSION}
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+def cached_coverage_table(feed_path, stops, pairs, routes=None, radius_m=WALK_RADIUS_M, cache_dir=COVERAGE_CACHE_DIR):
+    """coverage_table for a feed zip, read from the cache when the feed and radius are unchanged.
+
+    Older tables for the same feed are evicted when a new one is written.
+    """
+    feed_dir = os.path.join(cache_dir, os.path.splitext(os.path.basename(feed_path))[0])
+    path = os.path.join(feed_dir, f"{coverage_key(feed_path, radius_m)}.parquet")
+    if os.path.exists(path):
+        table = pd.read_parquet(path)
+        table['geometry'] = shapely.from_wkb(table['geometry'].to_numpy())
+        print(f"⚡ Coverage loaded from cache: {path}")
+        return table
+
+    start = time.perf_counter()
+    table = coverage_table(stops, pairs, routes, radius_m)
+    os.makedirs(feed_dir, exist_ok=True)
+    table.assign(geometry=shapely.to_wkb(table['geometry'].to_numpy())).to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    for name in os.listdir(feed_dir):
+        if os.path.join(feed_dir, name) != path:
+            os.remove(os.path.join(feed_dir, name))
+    print(f"🗺️ Coverage computed for {len(table)} groups ({time.perf_counter() - start:.1f}s)")
+    return table
+
+def print_coverage_report(table):
+    system = table[table['level'] == SYSTEM].iloc[0]
+    print(f"🚶 {system['stops']:,} stops cover {system['covered_km2']:.1f} km² within walking distance "
+          f"({system['overlap']:.0%} of the circles' area overlaps)")
+    for level in ('agency', 'route'):
+        rows = table[table['level'] == level]
+        if not rows.empty:
+            # Summed per-group area over system area: how many groups cover the average covered spot
+            print(f"  {level}: {len(rows)} groups, {rows['covered_km2'].sum() / system['covered_km2']:.2f}x system area, "
+                  f"median {rows['covered_km2'].median():.1f} km²")
+
+if __name__ == "__main__":
+    from regional_feed import build_regional_feed
+    from transfers import stop_route_pairs
+
+    parser = argparse.ArgumentParser(description="Dissolved walking coverage per route, agency and for the region.")
+    parser.add_argument("folder", nargs="?", default="notebooks/Regional GTFS", help="Folder of GTFS zips")
+    parser.add_argument("--radius", type=float, default=WALK_RADIUS_M, help="Walking radius in metres")
+    args = parser.parse_args()
+
+    feed = build_regional_feed(args.folder, tables=['routes', 'trips', 'stops', 'stop_times'], cluster_radius_m=None)
+    start = time.perf_counter()
+    pairs = stop_route_pairs(feed['trips'], feed['stop_times'])
+    table = coverage_table(feed['stops'], pairs, feed['routes'], args.radius)
+    print(f"⏱️ Coverage for {len(table)} groups ({time.perf_counter() - start:.2f}s)")
+    print_coverage_report(table)
+    print(table.drop(columns='geometry').sort_values('covered_km2', ascending=False).head(15).to_string(index=False))
@@ -0,0 +1,95 @@
+import os
+import json
+import shutil
+import hashlib
+import zipfile
+
+import pandas as pd
+
+from gtfs_schema import GTFS_SCHEMA, read_gtfs_table, print_memory_report
+
+# Parsed feeds live in cache/feeds/<feed name>/<zip sha1>-<schema key>/<table>.parquet
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "feeds")
+MANIFEST = "manifest.json"
+FEED_CACHE_VERSION = 1  # Bump whenever read_gtfs_table's parsing changes outside GTFS_SCHEMA
+
+def _update_with_file(digest, path):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+
+def file_hash(path):
+    """SHA-1 of any file's bytes, e.g. a spreadsheet that feeds a cached result."""
+    digest = hashlib.sha1()
+    _update_with_file(digest, path)
+    return digest.hexdigest()
+
+def zip_content_hash(zip_path):
+    """SHA-1 of the zip file's bytes."""
+    return file_hash(zip_path)
+
+def feeds_fingerprint(folder_path):
+    """Content hash over every feed zip in the folder, used to detect feed changes."""
+    digest = hashlib.sha1()
+    for file_name in sorted(os.listdir(folder_path)):
+        if file_name.endswith('.zip'):
+            digest.update(file_name.encode())
+            _update_with_file(digest, os.path.join(folder_path, file_name))
+    return digest.hexdigest()
+
+def schema_key():
+    """Short hash of GTFS_SCHEMA and FEED_CACHE_VERSION, so parsed tables follow schema changes."""
+    params = {'schema': GTFS_SCHEMA, 'version': FEED_CACHE_VERSION}
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+def _evict_stale(feed_dir, keep):
+    """Removes cached versions of a feed other than the current one."""
+    for name in os.listdir(feed_dir):
+        if name != keep:
+            shutil.rmtree(os.path.join(feed_dir, name), ignore_errors=True)
+            print(f"🧹 Evicted stale cache: {os.path.basename(feed_dir)}/{name}")
+
+def _build_entry(zip_path, entry_dir, report):
+    """Parses every schema table in the zip once and stores it as Parquet."""
+    tmp_dir = entry_dir + ".tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    tables = []
+    with zipfile.ZipFile(zip_path, 'r') as gtfs_zip:
+        names = set(gtfs_zip.namelist())
+        for table in GTFS_SCHEMA:
+            if f"{table}.txt" in names:
+                read_gtfs_table(gtfs_zip, table, report).to_parquet(os.path.join(tmp_dir, f"{table}.parquet"), index=False)
+                tables.append(table)
+    with open(os.path.join(tmp_dir, MANIFEST), 'w') as f:
+        json.dump({'source': os.path.basename(zip_path), 'schema': schema_key(), 'tables': tables}, f)
+    # Rename last so a half-written entry is never picked up
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    os.replace(tmp_dir, entry_dir)
+
+def load_feed_cached(zip_path, tables=None, cache_dir=CACHE_DIR, report=None):
+    """Loads schema-typed GTFS tables for one zip, parsing the CSVs only when the zip's content or the schema changed."""
+    feed_dir = os.path.join(cache_dir, os.path.splitext(os.path.basename(zip_path))[0])
+    entry_key = f"{zip_content_hash(zip_path)}-{schema_key()}"
+    entry_dir = os.path.join(feed_dir, entry_key)
+
+    if not os.path.exists(os.path.join(entry_dir, MANIFEST)):
+        print(f"⏳ Parsing {os.path.basename(zip_path)} into the feed cache")
+        os.makedirs(feed_dir, exist_ok=True)
+        _build_entry(zip_path, entry_dir, report)
+    _evict_stale(feed_dir, keep=entry_key)
+
+    with open(os.path.join(entry_dir, MANIFEST)) as f:
+        available = json.load(f)['tables']
+    wanted = available if tables is None else [table for table in tables if table in available]
+    return {table: pd.read_parquet(os.path.join(entry_dir, f"{table}.parquet")) for table in wanted}
+
+def load_folder_cached(folder_path, tables=None, cache_dir=CACHE_DIR):
+    """Loads every feed zip in a folder through the cache, keyed by file name."""
+    report = {}
+    feeds = {}
+    for file_name in sorted(os.listdir(folder_path)):
+        if file_name.endswith('.zip'):
+            feeds[file_name] = load_feed_cached(os.path.join(folder_path, file_name), tables, cache_dir, report)
+    if report:
+        print_memory_report(report)
+    return feeds
@@ -0,0 +1,145 @@
+import zipfile
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+# Column kinds:
+#   id        - identifiers, dictionary-encoded (category) so they compare the same in every table
+#   category  - repeated text (headsigns, timezones)
+#   text      - free text kept as strings
+#   time      - GTFS H:MM:SS (hours may exceed 24), parsed once to int32 seconds after midnight
+#   float64 / float32 / Int8 / Int16 / Int32 - numeric columns (nullable integers)
+GTFS_SCHEMA = {
+    'agency': {
+        'agency_id': 'id', 'agency_name': 'text', 'agency_url': 'text', 'agency_timezone': 'category',
+        'agency_lang': 'category', 'agency_phone': 'text', 'agency_fare_url': 'text', 'agency_email': 'text',
+    },
+    'routes': {
+        'route_id': 'id', 'agency_id': 'id', 'route_short_name': 'text', 'route_long_name': 'text',
+        'route_desc': 'text', 'route_type': 'Int16', 'route_url': 'text', 'route_color': 'text',
+        'route_text_color': 'text', 'route_sort_order': 'Int32',
+    },
+    'trips': {
+        'route_id': 'id', 'service_id': 'id', 'trip_id': 'id', 'shape_id': 'id', 'block_id': 'id',
+        'trip_headsign': 'category', 'trip_short_name': 'category', 'direction_id': 'Int8',
+        'wheelchair_accessible': 'Int8', 'bikes_allowed': 'Int8',
+    },
+    'stops': {
+        'stop_id': 'id', 'stop_code': 'text', 'stop_name': 'text', 'stop_desc': 'text',
+        'stop_lat': 'float64', 'stop_lon': 'float64', 'zone_id': 'id', 'stop_url': 'text',
+        'location_type': 'Int8', 'parent_station': 'id', 'stop_timezone': 'category', 'wheelchair_boarding': 'Int8',
+    },
+    'stop_times': {
+        'trip_id': 'id', 'arrival_time': 'time', 'departure_time': 'time', 'stop_id': 'id',
+        'stop_sequence': 'Int32', 'stop_headsign': 'category', 'pickup_type': 'Int8', 'drop_off_type': 'Int8',
+        'continuous_pickup': 'Int8', 'continuous_drop_off': 'Int8', 'shape_dist_traveled': 'float32', 'timepoint': 'Int8',
+    },
+    'shapes': {
+        # float32 keeps shape vertices to ~1 m, plenty for drawing lines
+        'shape_id': 'id', 'shape_pt_lat': 'float32', 'shape_pt_lon': 'float32',
+        'shape_pt_sequence': 'Int32', 'shape_dist_traveled': 'float32',
+    },
+    'calendar': {
+        'service_id': 'id', 'monday': 'Int8', 'tuesday': 'Int8', 'wednesday': 'Int8', 'thursday': 'Int8',
+        'friday': 'Int8', 'saturday': 'Int8', 'sunday': 'Int8', 'start_date': 'text', 'end_date': 'text',
+    },
+    'calendar_dates': {'service_id': 'id', 'date': 'text', 'exception_type': 'Int8'},
+    'frequencies': {'trip_id': 'id', 'start_time': 'time', 'end_time': 'time', 'headway_secs': 'Int32', 'exact_times': 'Int8'},
+    'transfers': {'from_stop_id': 'id', 'to_stop_id': 'id', 'transfer_type': 'Int8', 'min_transfer_time': 'Int32'},
+}
+
+STRING_KINDS = ('id', 'category', 'text', 'time')
+
+def parse_gtfs_time(times):
+    """Parses GTFS H:MM:SS strings to nullable int32 seconds, converting each distinct value only once."""
+    if not isinstance(times, pd.Series):
+        times = pd.Series(times, dtype=object)
+    codes, uniques = pd.factorize(times)
+    seconds = np.zeros(len(uniques), dtype=np.int32)
+    if len(uniques):
+        parts = pd.Series(uniques, dtype=object).astype(str).str.strip().str.split(':', expand=True).astype(np.int32)
+        seconds = (parts[0] * 3600 + parts[1] * 60 + parts[2]).to_numpy(np.int32)
+    missing = codes < 0
+    return pd.arrays.IntegerArray(np.where(missing, 0, seconds[codes]).astype(np.int32), missing)
+
+def format_gtfs_time(seconds):
+    """Formats seconds after midnight back to GTFS HH:MM:SS."""
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def _read_dtypes(table):
+    """read_csv dtypes: strings for everything that is converted afterwards, floats for numerics."""
+    dtypes = {}
+    for column, kind in GTFS_SCHEMA.get(table, {}).items():
+        if kind in STRING_KINDS:
+            dtypes[column] = str
+        elif kind.startswith('float'):
+            dtypes[column] = kind
+        else:
+            dtypes[column] = 'float64'  # Cast to nullable ints after reading
+    return dtypes
+
+def apply_schema(df, table):
+    """Converts a raw GTFS frame to the compact schema in place and returns it."""
+    for column, kind in GTFS_SCHEMA.get(table, {}).items():
+        if column not in df.columns:
+            continue
+        if kind in ('id', 'category'):
+            df[column] = df[column].astype('category')
+        elif kind == 'time':
+            df[column] = parse_gtfs_time(df[column])
+        elif kind == 'text':
+            continue  # Already read as strings
+        elif kind.startswith('Int'):
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(kind)
+        else:
+            df[column] = df[column].astype(kind)
+    return df
+
+def read_gtfs_table(source, table, report=None):
+    """Reads one GTFS table with the explicit schema from a folder path or an open zip.
+
+    If report is a dict, the memory before (plain strings) and after the schema is
+    accumulated into it per table; print it with print_memory_report.
+    """
+    file_name = f"{table}.txt"
+    if isinstance(source, zipfile.ZipFile):
+        df = pd.read_csv(BytesIO(source.read(file_name)), dtype=_read_dtypes(table))
+    else:
+        df = pd.read_csv(f"{source}/{file_name}", dtype=_read_dtypes(table))
+
+    before = df.memory_usage(deep=True).sum()
+    apply_schema(df, table)
+    if report is not None:
+        totals = report.setdefault(table, {'rows': 0, 'before': 0, 'after': 0})
+        totals['rows'] += len(df)
+        totals['before'] += before
+        totals['after'] += df.memory_usage(deep=True).sum()
+    return df
+
+def unify_categories(frames):
+    """Gives matching categorical columns the same categories so pd.concat keeps them categorical."""
+    columns = set().union(*(frame.columns for frame in frames))
+    for column in columns:
+        parts = [frame[column] for frame in frames if column in frame.columns]
+        if not all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            continue
+        categories = pd.Index(np.concatenate([part.cat.categories.to_numpy(dtype=object) for part in parts])).unique()
+        for frame in frames:
+            if column in frame.columns:
+                frame[column] = frame[column].cat.set_categories(categories)
+    return frames
+
+def concat_tables(frames):
+    """Concatenates schema-typed frames without falling back to object columns."""
+    return pd.concat(unify_categories(frames), ignore_index=True)
+
+def print_memory_report(report):
+    """Prints memory saved per table by the schema."""
+    print("💾 GTFS memory by table (plain strings -> schema):")
+    for table, totals in report.items():
+        before_mb = totals['before'] / 1e6
+        after_mb = totals['after'] / 1e6
+        saved = 100 * (1 - totals['after'] / totals['before']) if totals['before'] else 0
+        print(f"  {table:<15} {totals['rows']:>9,} rows  {before_mb:8.2f} MB -> {after_mb:8.2f} MB  ({saved:.0f}% saved)")
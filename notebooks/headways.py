@@ -0,0 +1,155 @@
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from gtfs_schema import parse_gtfs_time
+
+DAY_SECONDS = 86400
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# Periods are [start, end) in time of day; an end before the start wraps past midnight
+DEFAULT_PERIODS = {
+    'AM_Peak': ('06:00:00', '09:00:00'),
+    'Midday': ('09:00:00', '15:00:00'),
+    'PM_Peak': ('15:00:00', '18:00:00'),
+    'Evening': ('18:00:00', '22:00:00'),
+    'Night': ('22:00:00', '06:00:00'),
+}
+DAY_TYPES = {
+    'weekday': WEEKDAYS[:5],
+    'saturday': ['saturday'],
+    'sunday': ['sunday'],
+}
+ALL_DAYS = 'all'  # Day type used when a feed has no calendar
+HEADWAY_COLUMNS = ['route_id', 'stop_id', 'day_type', 'period', 'departures',
+                   'mean_headway_min', 'min_headway_min', 'max_headway_min']
+
+def _seconds(value):
+    """Seconds after midnight from GTFS H:MM:SS text or a number of seconds."""
+    if isinstance(value, str):
+        return int(parse_gtfs_time([value])[0])
+    return int(value)
+
+def service_day_types(calendar=None, calendar_dates=None, day_types=DAY_TYPES):
+    """(service_id, day_type) pairs: a service belongs to every day type it runs on in calendar,
+    or on which calendar_dates adds it. None when the feed has neither table."""
+    pairs = []
+    if calendar is not None and not calendar.empty:
+        for day_type, days in day_types.items():
+            runs = calendar[days].fillna(0).astype(int).to_numpy().any(axis=1)
+            pairs.append(pd.DataFrame({'service_id': calendar['service_id'].to_numpy()[runs], 'day_type': day_type}))
+    if calendar_dates is not None and not calendar_dates.empty:
+        added = calendar_dates[calendar_dates['exception_type'] == 1]
+        weekday = pd.Series(np.array(WEEKDAYS)[pd.to_datetime(added['date'].astype(str), format='%Y%m%d').dt.dayofweek],
+                            index=added.index)
+        for day_type, days in day_types.items():
+            runs = weekday.isin(days).to_numpy()
+            pairs.append(pd.DataFrame({'service_id': added['service_id'].to_numpy()[runs], 'day_type': day_type}))
+    if not pairs:
+        return None
+    pairs = pd.concat(pairs, ignore_index=True)
+    pairs['service_id'] = pairs['service_id'].astype(str)
+    return pairs.drop_duplicates()
+
+def stop_headways(trips, stop_times, periods=DEFAULT_PERIODS, calendar=None, calendar_dates=None, day_types=DAY_TYPES):
+    """Headways for every route x stop x day type x period, from one sort and diff over integer seconds.
+
+    stop_times may hold arrival_time as GTFS text or as the schema's int seconds; times past
+    24:00:00 count at their time of day. Returns a tidy frame with one row per group:
+    route_id, stop_id, day_type, period, departures and the mean/min/max headway in minutes
+    (NaN where a stop is served once in the period).
+    """
+    arrivals = stop_times['arrival_time']
+    if not pd.api.types.is_numeric_dtype(arrivals):
+        arrivals = parse_gtfs_time(arrivals)
+    visits = pd.DataFrame({
+        'trip_id': stop_times['trip_id'].astype(str).to_numpy(),
+        'stop_id': stop_times['stop_id'].astype(str).to_numpy(),
+        'seconds': pd.array(arrivals, dtype='Int32')
+    }).dropna(subset=['seconds'])
+    visits['seconds'] = visits['seconds'].astype(np.int32) % DAY_SECONDS
+
+    trip_info = pd.DataFrame({
+        'trip_id': trips['trip_id'].astype(str).to_numpy(),
+        'route_id': trips['route_id'].astype(str).to_numpy(),
+        'service_id': trips['service_id'].astype(str).to_numpy()
+    })
+    visits = visits.merge(trip_info, on='trip_id')
+
+    service_days = service_day_types(calendar, calendar_dates, day_types)
+    if service_days is None:
+        visits['day_type'] = ALL_DAYS
+    else:
+        visits = visits.merge(service_days, on='service_id')
+
+    # Label each visit with every period it falls in (periods may overlap or wrap midnight)
+    in_periods = []
+    for period, (start, end) in periods.items():
+        start, end = _seconds(start) % DAY_SECONDS, _seconds(end) % DAY_SECONDS
+        seconds = visits['seconds']
+        mask = (seconds >= start) & (seconds < end) if start < end else (seconds >= start) | (seconds < end)
+        in_periods.append(visits.loc[mask, ['route_id', 'stop_id', 'day_type', 'seconds']].assign(period=period))
+    visits = pd.concat(in_periods, ignore_index=True) if in_periods else visits.iloc[:0]
+    if visits.empty:
+        return pd.DataFrame(columns=HEADWAY_COLUMNS)
+
+    # Keys as one integer code so the sort and the group boundaries are plain numpy
+    keys = ['route_id', 'stop_id', 'day_type', 'period']
+    codes = visits.groupby(keys, sort=False).ngroup().to_numpy()
+    seconds = visits['seconds'].to_numpy()
+    # A period wrapping midnight runs from its start, so times after midnight sort after the rest
+    for period, (start, end) in periods.items():
+        start, end = _seconds(start) % DAY_SECONDS, _seconds(end) % DAY_SECONDS
+        if start > end:
+            wraps = (visits['period'] == period).to_numpy() & (seconds < end)
+            seconds = np.where(wraps, seconds + DAY_SECONDS, seconds)
+    order = np.lexsort((seconds, codes))
+    codes, seconds = codes[order], seconds[order]
+    # Overlapping services can repeat a departure for the same day type; count it once
+    distinct = np.r_[True, (codes[1:] != codes[:-1]) | (seconds[1:] != seconds[:-1])]
+    order, codes, seconds = order[distinct], codes[distinct], seconds[distinct]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    headway = np.diff(seconds, prepend=0).astype(np.float64) / 60
+    headway[starts] = np.nan  # First visit of each group
+
+    grouped = pd.DataFrame({'group': codes, 'headway': headway}).groupby('group')['headway']
+    firsts = visits.iloc[order[starts]]
+    return pd.DataFrame({
+        'route_id': firsts['route_id'].to_numpy(),
+        'stop_id': firsts['stop_id'].to_numpy(),
+        'day_type': firsts['day_type'].to_numpy(),
+        'period': firsts['period'].to_numpy(),
+        'departures': grouped.size().to_numpy(),
+        'mean_headway_min': grouped.mean().to_numpy(),
+        'min_headway_min': grouped.min().to_numpy(),
+        'max_headway_min': grouped.max().to_numpy(),
+    })
+
+def route_headways(table):
+    """Route-level headways per day type and period: the mean over the route's stops served more than once."""
+    served = table.dropna(subset=['mean_headway_min'])
+    return (served.groupby(['route_id', 'day_type', 'period'], sort=False)
+            .agg(stops=('stop_id', 'size'), mean_headway_min=('mean_headway_min', 'mean'))
+            .reset_index())
+
+if __name__ == "__main__":
+    from regional_feed import build_regional_feed
+
+    parser = argparse.ArgumentParser(description="Stop and route headways for every regional feed.")
+    parser.add_argument("folder", nargs="?", default="notebooks/Regional GTFS", help="Folder of GTFS zips")
+    parser.add_argument("--output", help="Write the route x stop x day type x period table to this CSV")
+    args = parser.parse_args()
+
+    feed = build_regional_feed(args.folder, tables=['trips', 'stop_times', 'calendar', 'calendar_dates'], cluster_radius_m=None)
+    start = time.perf_counter()
+    table = stop_headways(feed['trips'], feed['stop_times'], calendar=feed.get('calendar'), calendar_dates=feed.get('calendar_dates'))
+    print(f"⏱️ {len(table):,} route x stop x day type x period headways from {len(feed['stop_times']):,} stop times "
+          f"({time.perf_counter() - start:.2f}s)")
+
+    routes = route_headways(table)
+    print(routes.pivot_table(index='route_id', columns=['day_type', 'period'], values='mean_headway_min').round(1).head(20))
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print(f"🗂️ Headways saved: {args.output}")
@@ -0,0 +1,118 @@
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from isochrone_polygons import to_metric, to_lat_lon
+from ridership_cube import clean_ridership
+
+HEX_SIZES_M = (250, 750, 2000)  # Hexagon circumradius per resolution, finest first
+TOP_ROUTES = 3
+NO_ROUTE = 'unknown'  # Label for ridership rows without a route
+SQRT3 = np.sqrt(3)
+
+def hex_axial(x, y, size_m):
+    """Axial (q, r) of the pointy-top hexagon of circumradius size_m holding each metric point."""
+    q = (SQRT3 / 3 * x - y / 3) / size_m
+    r = (2 / 3 * y) / size_m
+    # Cube rounding: round all three coordinates, then fix the one that moved most
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+def hex_center(q, r, size_m):
+    """Metric centre of axial hexagons."""
+    return size_m * SQRT3 * (q + r / 2), size_m * 1.5 * r
+
+def hex_corners(cx, cy, size_m):
+    """(cells, 6) metric x and y of each hexagon's corners."""
+    angles = np.radians(30 + 60 * np.arange(6))
+    return cx[:, None] + size_m * np.cos(angles), cy[:, None] + size_m * np.sin(angles)
+
+def hex_ridership(ridership, sizes=HEX_SIZES_M, top_n=TOP_ROUTES, lat_column='Lat', lon_column='Lon',
+                  stop_column='Stop', route_column='Route', value_column='Ridership'):
+    """Stop-level ridership binned into hexagons at each size, from array ops over all rows.
+
+    One row per non-empty cell: size_m, q, r (axial coordinates), stops (distinct stop ids),
+    ridership, per_km2, top_routes ("Route 12: 3,400" lines for the busiest top_n routes),
+    center_lat / center_lon and corners ([lat, lon] pairs, ready for a polygon).
+    """
+    # Stops and routes as integer codes; only the distinct route ids are turned into text.
+    # Blank routes get their own label, and blank stops are left out of the stop counts.
+    route_codes, route_ids = pd.factorize(ridership[route_column])
+    route_labels = np.append(pd.Index(route_ids).astype(str).to_numpy(dtype=object), NO_ROUTE)
+    stop_codes = pd.factorize(ridership[stop_column])[0]
+    rows = pd.DataFrame({
+        'lat': pd.to_numeric(ridership[lat_column], errors='coerce').to_numpy(),
+        'lon': pd.to_numeric(ridership[lon_column], errors='coerce').to_numpy(),
+        'stop': np.where(stop_codes < 0, np.nan, stop_codes),
+        'route': np.where(route_codes < 0, len(route_ids), route_codes),
+        'ridership': clean_ridership(ridership[value_column]).to_numpy()
+    }).dropna(subset=['lat', 'lon'])
+    origin = (rows['lat'].mean(), rows['lon'].mean())
+    x, y = to_metric(rows['lat'].to_numpy(), rows['lon'].to_numpy(), *origin)
+
+    tables = []
+    for size_m in sizes:
+        rows['q'], rows['r'] = hex_axial(x, y, size_m)
+        cells = rows.groupby(['q', 'r']).agg(stops=('stop', 'nunique'), ridership=('ridership', 'sum')).reset_index()
+
+        # Busiest routes per cell: one sort of the cell x route totals, then the first top_n of each cell
+        by_route = rows.groupby(['q', 'r', 'route'])['ridership'].sum().reset_index()
+        by_route = by_route.sort_values(['q', 'r', 'ridership'], ascending=[True, True, False])
+        by_route = by_route.groupby(['q', 'r']).head(top_n)
+        lines = "Route " + route_labels[by_route['route'].to_numpy()] + ": " + by_route['ridership'].map('{:,.0f}'.format)
+        top_routes = lines.groupby([by_route['q'], by_route['r']], sort=True).agg("<br>".join)
+        cells['top_routes'] = top_routes.to_numpy()  # Both sorted by (q, r)
+
+        cx, cy = hex_center(cells['q'].to_numpy(), cells['r'].to_numpy(), size_m)
+        cells['center_lat'], cells['center_lon'] = to_lat_lon(cx, cy, *origin)
+        corner_x, corner_y = hex_corners(cx, cy, size_m)
+        corner_lat, corner_lon = to_lat_lon(corner_x, corner_y, *origin)
+        cells['corners'] = np.stack([corner_lat, corner_lon], axis=-1).round(6).tolist()
+        cells['per_km2'] = cells['ridership'] / (1.5 * SQRT3 * size_m ** 2 / 1e6)
+        cells.insert(0, 'size_m', size_m)
+        tables.append(cells)
+    return pd.concat(tables, ignore_index=True)
+
+def hex_feature_collection(cells, colormap=None):
+    """GeoJSON polygons for hex cells of one size; colormap (value -> color) is applied to per_km2."""
+    features = []
+    for cell in cells.itertuples(index=False):
+        ring = [[lon, lat] for lat, lon in cell.corners]
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [ring + ring[:1]]},
+            "properties": {
+                "stops": int(cell.stops),
+                "ridership": f"{cell.ridership:,.0f}",
+                "top_routes": cell.top_routes,
+                "color": colormap(cell.per_km2) if colormap else None
+            }
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bin stop-level ridership into hexagons at several sizes.")
+    parser.add_argument("ridership", nargs="?", default="notebooks/ridership.csv", help="Ridership CSV (Route, Stop, Ridership, Lat, Lon)")
+    parser.add_argument("--sizes", type=float, nargs="+", default=list(HEX_SIZES_M), help="Hexagon circumradii in metres")
+    parser.add_argument("--output", help="Write the cell table (without corners) to this CSV")
+    args = parser.parse_args()
+
+    ridership = pd.read_csv(args.ridership)
+    start = time.perf_counter()
+    cells = hex_ridership(ridership, args.sizes)
+    print(f"⬡ {len(ridership):,} ridership rows binned into {len(cells):,} cells ({time.perf_counter() - start:.2f}s)")
+    for size_m, table in cells.groupby('size_m'):
+        busiest = table.loc[table['ridership'].idxmax()]
+        print(f"  {size_m:g} m: {len(table):,} cells, busiest {busiest['ridership']:,.0f} riders at "
+              f"({busiest['center_lat']:.4f}, {busiest['center_lon']:.4f}) across {busiest['stops']} stops")
+    if args.output:
+        cells.drop(columns='corners').to_csv(args.output, index=False)
+        print(f"🗂️ Cells saved: {args.output}")
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import networkx as nx
+
+from feed_cache import feeds_fingerprint, file_hash
+from regional_feed import build_regional_feed
+from isochrone_polygons import isochrone_polygons, to_metric, DEFAULT_BANDS, WALK_SPEED_M_PER_MIN
+
+ACCESS_RADIUS_M = 800  # Walk from a hub to its boarding stops (~10 min)
+DEFAULT_MINUTES = 60
+OUTPUT_DIR = "hub_accessibility"
+HUB_NODE = "__hub__"
+
+# Set once per worker process by _init_worker
+_NETWORK = None
+_STOPS = None
+_STOP_ROUTES = None
+
+def load_timetable(folder_path):
+    """Loads stops, trips and stop_times from every feed with agency-prefixed IDs."""
+    feed = build_regional_feed(folder_path, tables=['stops', 'trips', 'stop_times'])
+    stops = feed['stops'][['stop_id', 'stop_name', 'stop_lat', 'stop_lon', 'feed', 'stop_cluster_id']]
+    return stops, feed['trips'][['route_id', 'trip_id']], feed['stop_times']
+
+def build_network(stop_times):
+    """Builds a stop-to-stop graph weighted by the fastest scheduled ride (minutes) between consecutive stops."""
+    st = stop_times.sort_values(['trip_id', 'stop_sequence'])
+    departures = st['departure_time'].to_numpy(dtype=float, na_value=np.nan)
+    arrivals = st['arrival_time'].to_numpy(dtype=float, na_value=np.nan)
+
+    trip_codes = st['trip_id'].cat.codes.values
+    stop_ids = st['stop_id'].to_numpy(dtype=object)
+    same_trip = trip_codes[1:] == trip_codes[:-1]
+    edges = pd.DataFrame({
+        'from_stop': stop_ids[:-1][same_trip],
+        'to_stop': stop_ids[1:][same_trip],
+        'minutes': ((arrivals[1:] - departures[:-1]) / 60)[same_trip]
+    })
+    edges = edges[edges.minutes >= 0].groupby(['from_stop', 'to_stop'], sort=False)['minutes'].min().reset_index()
+
+    graph = nx.DiGraph()
+    graph.add_weighted_edges_from(edges.itertuples(index=False, name=None))
+    return graph
+
+def build_stop_routes(trips, stop_times):
+    """Distinct (stop_id, route_id) pairs."""
+    return stop_times[['trip_id', 'stop_id']].drop_duplicates().merge(trips, on='trip_id')[['stop_id', 'route_id']].drop_duplicates()
+
+def load_hubs(excel_path):
+    """Loads hub locations from the ARC hub spreadsheet (coordinate string, name, hub type)."""
+    hubs_df = pd.read_excel(excel_path)
+    coordinates = hubs_df.iloc[:, 0].astype(str).str.split(',', expand=True).astype(float)
+    return pd.DataFrame({
+        'hub_name': hubs_df.iloc[:, 1].astype(str),
+        'hub_type': hubs_df.iloc[:, 2].astype(str),
+        'hub_lat': coordinates[0],
+        'hub_lon': coordinates[1]
+    })
+
+def _init_worker(network, stops, stop_routes):
+    global _NETWORK, _STOPS, _STOP_ROUTES
+    _NETWORK, _STOPS, _STOP_ROUTES = network, stops, stop_routes
+
+def analyze_hub(hub, minutes):
+    """Stops, routes and isochrone polygons reachable from one hub within the time budget."""
+    start = time.perf_counter()
+
+    # Walk access from the hub to nearby boarding stops
+    x, y = to_metric(_STOPS.stop_lat.values, _STOPS.stop_lon.values, hub['hub_lat'], hub['hub_lon'])
+    distance = np.hypot(x, y)
+    nearby = distance <= ACCESS_RADIUS_M
+    access = dict(zip(_STOPS.stop_id.values[nearby], distance[nearby] / WALK_SPEED_M_PER_MIN))
+
+    reached = {}
+    if access:
+        _NETWORK.add_weighted_edges_from((HUB_NODE, stop_id, walk) for stop_id, walk in access.items())
+        try:
+            reached = nx.single_source_dijkstra_path_length(_NETWORK, HUB_NODE, cutoff=minutes)
+        finally:
+            _NETWORK.remove_node(HUB_NODE)
+        reached.pop(HUB_NODE, None)
+        # Boarding stops with no departures are not in the graph but are still walkable
+        for stop_id, walk in access.items():
+            reached.setdefault(stop_id, walk)
+
+    reached_ids = list(reached)
+    routes = np.sort(_STOP_ROUTES.route_id[_STOP_ROUTES.stop_id.isin(reached_ids)].unique())
+    bands = [band for band in DEFAULT_BANDS if band < minutes] + [minutes]
+    polygons = isochrone_polygons(reached, _STOPS, bands=bands)
+    for feature in polygons['features']:
+        feature['properties']['hub_name'] = hub['hub_name']
+
+    row = {
+        'hub_name': hub['hub_name'],
+        'hub_type': hub['hub_type'],
+        'hub_lat': hub['hub_lat'],
+        'hub_lon': hub['hub_lon'],
+        'access_stops': len(access),
+        'reachable_stops': len(reached_ids),
+        'reachable_routes': len(routes),
+        'agencies': ";".join(sorted({stop_id.split(':', 1)[0] for stop_id in reached_ids})),
+        'route_ids': ";".join(routes),
+        'seconds': round(time.perf_counter() - start, 3)
+    }
+    return row, polygons['features']
+
+def run_batch(folder_path, excel_path, minutes=DEFAULT_MINUTES, output_dir=OUTPUT_DIR, workers=None, force=False):
+    """Computes accessibility for every hub, fanning hubs out across a process pool."""
+    os.makedirs(output_dir, exist_ok=True)
+    table_path = os.path.join(output_dir, "hub_accessibility.csv")
+    geojson_path = os.path.join(output_dir, "hub_isochrones.geojson")
+    stamp_path = os.path.join(output_dir, "fingerprint.json")
+
+    stamp = {
+        'feeds': feeds_fingerprint(folder_path),
+        'hubs': file_hash(excel_path),
+        'minutes': minutes
+    }
+    if not force and os.path.exists(stamp_path) and os.path.exists(table_path):
+        with open(stamp_path) as f:
+            if json.load(f) == stamp:
+                print(f"✅ Feeds and hubs unchanged, reusing {table_path}")
+                return pd.read_csv(table_path)
+
+    start = time.perf_counter()
+    stops, trips, stop_times = load_timetable(folder_path)
+    network = build_network(stop_times)
+    stop_routes = build_stop_routes(trips, stop_times)
+    hubs = load_hubs(excel_path)
+    print(f"🚌 Timetable loaded: {len(stops)} stops, {network.number_of_edges()} links "
+          f"({time.perf_counter() - start:.1f}s)")
+
+    rows, features = [], []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(network, stops, stop_routes)) as pool:
+        futures = [pool.submit(analyze_hub, hub, minutes) for hub in hubs.to_dict('records')]
+        for future in as_completed(futures):
+            row, hub_features = future.result()
+            rows.append(row)
+            features.extend(hub_features)
+            print(f"  📍 {row['hub_name']}: {row['reachable_stops']} stops, "
+                  f"{row['reachable_routes']} routes ({row['seconds']:.2f}s)")
+
+    results = pd.DataFrame(rows).sort_values('hub_name').reset_index(drop=True)
+    results.to_csv(table_path, index=False)
+    with open(geojson_path, 'w') as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f, separators=(',', ':'))
+    with open(stamp_path, 'w') as f:
+        json.dump(stamp, f)
+
+    print(f"🗂️ Results saved: {table_path}, {geojson_path} ({time.perf_counter() - start:.1f}s total)")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch accessibility for all ARC hubs.")
+    parser.add_argument("--folder", default="notebooks/Regional GTFS", help="Folder of GTFS .zip feeds")
+    parser.add_argument("--hubs", default="notebooks/Hub_Locations.xlsx", help="Hub locations spreadsheet")
+    parser.add_argument("--minutes", type=int, default=DEFAULT_MINUTES, help="Travel time budget in minutes")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="Output directory")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Recompute even if feeds are unchanged")
+    args = parser.parse_args()
+
+    run_batch(args.folder, args.hubs, args.minutes, args.output, args.workers, args.force)
@@ -0,0 +1,117 @@
+import json
+import numpy as np
+import pandas as pd
+import contourpy
+import folium
+
+# Travel-time bands (minutes) drawn as nested reachability areas
+DEFAULT_BANDS = (15, 30, 45, 60)
+BAND_COLORS = {15: '#1a9850', 30: '#91cf60', 45: '#fee08b', 60: '#fc8d59'}
+WALK_SPEED_M_PER_MIN = 80  # ~4.8 km/h
+CELL_SIZE_M = 100
+METERS_PER_DEG_LAT = 110_540.0
+METERS_PER_DEG_LON = 111_320.0
+
+def to_metric(lat, lon, origin_lat, origin_lon):
+    """Projects lat/lon onto a local equirectangular metric plane around the origin."""
+    x = (np.asarray(lon) - origin_lon) * METERS_PER_DEG_LON * np.cos(np.radians(origin_lat))
+    y = (np.asarray(lat) - origin_lat) * METERS_PER_DEG_LAT
+    return x, y
+
+def to_lat_lon(x, y, origin_lat, origin_lon):
+    """Inverse of to_metric."""
+    lon = origin_lon + np.asarray(x) / (METERS_PER_DEG_LON * np.cos(np.radians(origin_lat)))
+    lat = origin_lat + np.asarray(y) / METERS_PER_DEG_LAT
+    return lat, lon
+
+def rasterize_travel_times(x, y, minutes, max_minutes, cell_size_m=CELL_SIZE_M, walk_speed=WALK_SPEED_M_PER_MIN):
+    """Burns each stop's arrival time plus walking time into a metric grid (minimum over stops)."""
+    max_walk_cells = int(np.ceil(max_minutes * walk_speed / cell_size_m))
+
+    # Grid covers every reachable stop plus the longest possible walk out of it
+    x0 = x.min() - (max_walk_cells + 1) * cell_size_m
+    y0 = y.min() - (max_walk_cells + 1) * cell_size_m
+    n_cols = int(np.ceil((x.max() - x0) / cell_size_m)) + max_walk_cells + 2
+    n_rows = int(np.ceil((y.max() - y0) / cell_size_m)) + max_walk_cells + 2
+    grid = np.full((n_rows, n_cols), np.inf, dtype=np.float32)
+
+    # Walking minutes from a cell centre to its neighbours, computed once and reused for every stop
+    offsets = np.arange(-max_walk_cells, max_walk_cells + 1)
+    kernel = (np.hypot(*np.meshgrid(offsets, offsets)) * cell_size_m / walk_speed).astype(np.float32)
+
+    cols = np.round((x - x0) / cell_size_m).astype(int)
+    rows = np.round((y - y0) / cell_size_m).astype(int)
+    remaining = max_minutes - minutes
+    radii = np.floor(remaining * walk_speed / cell_size_m).astype(int)
+
+    for row, col, start, radius in zip(rows, cols, minutes.astype(np.float32), radii):
+        k = slice(max_walk_cells - radius, max_walk_cells + radius + 1)
+        window = grid[row - radius:row + radius + 1, col - radius:col + radius + 1]
+        np.minimum(window, start + kernel[k, k], out=window)
+
+    xs = x0 + np.arange(n_cols) * cell_size_m
+    ys = y0 + np.arange(n_rows) * cell_size_m
+    return xs, ys, grid
+
+def _filled_to_geojson(filled, origin_lat, origin_lon):
+    """Converts contourpy OuterOffset output into GeoJSON MultiPolygon coordinates."""
+    polygons = []
+    for points, offsets in zip(*filled):
+        lat, lon = to_lat_lon(points[:, 0], points[:, 1], origin_lat, origin_lon)
+        coords = np.column_stack([np.round(lon, 6), np.round(lat, 6)])
+        rings = [coords[start:end].tolist() for start, end in zip(offsets[:-1], offsets[1:])]
+        polygons.append(rings)
+    return polygons
+
+def isochrone_polygons(isochrone, stops, bands=DEFAULT_BANDS, cell_size_m=CELL_SIZE_M, walk_speed=WALK_SPEED_M_PER_MIN):
+    """Builds nested travel-time band polygons from an isochrone (stop_id -> minutes) as a GeoJSON FeatureCollection."""
+    bands = sorted(bands)
+    max_minutes = bands[-1]
+
+    reached = pd.Series(isochrone, dtype=float)
+    reached = reached[reached <= max_minutes]
+    stop_coords = stops.drop_duplicates('stop_id').set_index('stop_id')[['stop_lat', 'stop_lon']]
+    reached_stops = stop_coords.join(reached.rename('minutes'), how='inner')
+    if reached_stops.empty:
+        return {"type": "FeatureCollection", "features": []}
+
+    origin_lat = reached_stops.stop_lat.mean()
+    origin_lon = reached_stops.stop_lon.mean()
+    x, y = to_metric(reached_stops.stop_lat.values, reached_stops.stop_lon.values, origin_lat, origin_lon)
+    xs, ys, grid = rasterize_travel_times(x, y, reached_stops.minutes.values, max_minutes, cell_size_m, walk_speed)
+
+    # contourpy needs finite values; anything unreachable sits above the last band
+    grid[~np.isfinite(grid)] = max_minutes + 1
+    generator = contourpy.contour_generator(xs, ys, grid, fill_type=contourpy.FillType.OuterOffset)
+
+    features = []
+    for band in reversed(bands):  # Largest first so smaller bands draw on top
+        polygons = _filled_to_geojson(generator.filled(-1, band), origin_lat, origin_lon)
+        if polygons:
+            features.append({
+                "type": "Feature",
+                "properties": {"minutes": band, "color": BAND_COLORS.get(band, '#3186cc')},
+                "geometry": {"type": "MultiPolygon", "coordinates": polygons}
+            })
+    return {"type": "FeatureCollection", "features": features}
+
+def export_isochrone_geojson(feature_collection, output_path):
+    """Writes isochrone polygons to a GeoJSON file."""
+    with open(output_path, 'w') as f:
+        json.dump(feature_collection, f, separators=(',', ':'))
+    print(f"🗺️ Isochrone polygons saved: {output_path}")
+
+def add_isochrones_to_map(m, feature_collection, name="Isochrones"):
+    """Adds isochrone bands to a folium map, colored by band."""
+    folium.GeoJson(
+        feature_collection,
+        name=name,
+        style_function=lambda feature: {
+            'fillColor': feature['properties']['color'],
+            'color': feature['properties']['color'],
+            'weight': 1,
+            'fillOpacity': 0.35
+        },
+        tooltip=folium.GeoJsonTooltip(fields=['minutes'], aliases=['Minutes:'])
+    ).add_to(m)
+    return m
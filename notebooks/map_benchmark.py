@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import tempfile
+import subprocess
+import importlib.util
+from contextlib import contextmanager
+
+NOTEBOOKS_DIR = os.path.dirname(os.path.abspath(__file__))
+FEED_FOLDER = os.path.join(NOTEBOOKS_DIR, "Regional GTFS")
+HUBS_PATH = os.path.join(NOTEBOOKS_DIR, "Hub_Locations.xlsx")
+RESULT_MARKER = "@@benchmark "
+
+# Each renderer is its script as shipped, driven the same way its __main__ block drives it
+RENDERERS = {
+    'regional_3_0': {'script': "Regional GTFS (3.0).py", 'kind': 'transit_app'},
+    'arc_hubs': {'script': "ARC Hub Locations.py", 'kind': 'transit_app'},
+    'regionwide': {'script': "Regionwide GTFS.py", 'kind': 'regionwide'},
+}
+
+# Limits per renderer, set with headroom over the measured baseline; any metric over its limit fails
+# the run. Override with --budget FILE (same layout).
+DEFAULT_BUDGETS = {
+    'regional_3_0': {'total_s': 20, 'html_mb': 4, 'peak_rss_mb': 1500},
+    'arc_hubs': {'total_s': 20, 'html_mb': 4, 'peak_rss_mb': 1500},
+    'regionwide': {'total_s': 20, 'html_mb': 4, 'data_mb': 8, 'peak_rss_mb': 1500},
+}
+STAGES = ['load', 'index', 'render', 'assemble', 'save']
+
+def load_script(script):
+    """Imports one of the notebook scripts (file names have spaces) without running its __main__ block."""
+    if NOTEBOOKS_DIR not in sys.path:
+        sys.path.insert(0, NOTEBOOKS_DIR)
+    spec = importlib.util.spec_from_file_location(os.path.splitext(script)[0].replace(' ', '_'),
+                                                  os.path.join(NOTEBOOKS_DIR, script))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@contextmanager
+def stage(timings, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0) + time.perf_counter() - start
+
+def _timed(module, function_name, timings, name, **overrides):
+    """Swaps a function the script imported for one that records its time under a stage."""
+    function = getattr(module, function_name)
+
+    def wrapper(*args, **kwargs):
+        with stage(timings, name):
+            return function(*args, **{**kwargs, **overrides})
+    setattr(module, function_name, wrapper)
+
+def bench_transit_app(module, timings, cold):
+    """TransitMapApp scripts: find feeds (+ hubs), render fragments in workers, assemble and stream the map."""
+    overrides = {'cache_dir': os.path.join(os.getcwd(), "fragments")} if cold else {}
+    _timed(module, 'render_fragment_files', timings, 'render', **overrides)
+    _timed(module, 'save_map_streaming', timings, 'save')
+
+    app = module.TransitMapApp()
+    with stage(timings, 'load'):
+        app.load_gtfs(FEED_FOLDER)
+        if hasattr(app, 'load_hubs'):
+            app.load_hubs(HUBS_PATH)
+    with stage(timings, 'display'):
+        app.display_routes()
+    timings['assemble'] = timings.pop('display') - timings.get('render', 0) - timings.get('save', 0)
+    return "transit_map.html", []
+
+def bench_regionwide(module, timings, cold):
+    """Regionwide GTFS: merged load and route/stop processing, then the page and route data the viewer ships."""
+    with stage(timings, 'load'):
+        routes, shapes, trips, stops, stop_times = module.load_gtfs_from_folder(FEED_FOLDER)
+    with stage(timings, 'index'):
+        routes, shapes, stops, stop_routes = module.process_routes(routes, shapes, trips, stops, stop_times)
+    with stage(timings, 'render'):
+        page, route_features = module.build_viewer(routes, shapes, stops, stop_routes)
+    with stage(timings, 'save'):
+        with open("transit_map.html", 'w', encoding='utf-8') as f:
+            f.write(page)
+        with open("routes.json", 'w', encoding='utf-8') as f:
+            json.dump(route_features, f, separators=(',', ':'))
+    return "transit_map.html", ["routes.json"]
+
+def count_features(html):
+    """GeoJSON features plus individually drawn folium vectors in a saved map."""
+    geojson = html.count('"type":"Feature"') + html.count('"type": "Feature"')
+    vectors = html.count('L.circleMarker(') + html.count('L.polyline(') + html.count('L.marker(')
+    return geojson + vectors
+
+def run_renderer(name, cold=False):
+    """Runs one renderer in a scratch directory and returns its measurements (call in a fresh process)."""
+    spec = RENDERERS[name]
+    os.chdir(tempfile.mkdtemp(prefix=f"map_benchmark_{name}_"))
+    timings = {}
+    start = time.perf_counter()
+    module = load_script(spec['script'])
+    bench = bench_transit_app if spec['kind'] == 'transit_app' else bench_regionwide
+    html_path, data_paths = bench(module, timings, cold)
+    total = time.perf_counter() - start
+
+    with open(html_path, encoding='utf-8') as f:
+        html = f.read()
+    features = count_features(html)
+    for path in data_paths:
+        with open(path, encoding='utf-8') as f:
+            features += count_features(f.read())
+    gz_path = html_path + ".gz"
+    # ru_maxrss is in KB on Linux
+    return {
+        'renderer': name,
+        'cold': cold,
+        **{f"{stage_name}_s": round(timings[stage_name], 3) for stage_name in STAGES if stage_name in timings},
+        'total_s': round(total, 3),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'worker_peak_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        'html_mb': round(os.path.getsize(html_path) / 1e6, 3),
+        'gzip_mb': round(os.path.getsize(gz_path) / 1e6, 3) if os.path.exists(gz_path) else None,
+        'data_mb': round(sum(os.path.getsize(path) for path in data_paths) / 1e6, 3),
+        'features': features,
+        'output': os.path.abspath(html_path)
+    }
+
+def run_isolated(name, cold=False):
+    """Runs a renderer in its own Python process so timings and peak memory don't bleed between renderers."""
+    command = [sys.executable, os.path.abspath(__file__), "--run-one", name] + (["--cold"] if cold else [])
+    completed = subprocess.run(command, capture_output=True, text=True)
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    print(completed.stdout[-2000:])
+    print(completed.stderr[-2000:])
+    raise RuntimeError(f"Renderer {name} failed (exit code {completed.returncode})")
+
+def check_budgets(results, budgets):
+    """List of (renderer, metric, value, limit) for every metric over budget."""
+    failures = []
+    for result in results:
+        for metric, limit in budgets.get(result['renderer'], {}).items():
+            value = result.get(metric)
+            if value is not None and value > limit:
+                failures.append((result['renderer'], metric, value, limit))
+    return failures
+
+def print_report(results, budgets):
+    print("📊 Map generation benchmark:")
+    header = (f"  {'renderer':<14}" + "".join(f"{s:>9}" for s in STAGES) +
+              f"{'total':>9}{'rss MB':>9}{'html MB':>9}{'gz MB':>8}{'data MB':>9}{'features':>10}")
+    print(header)
+    for result in results:
+        stages = "".join(f"{result[f'{s}_s']:>8.2f}s" if f"{s}_s" in result else f"{'-':>9}" for s in STAGES)
+        gz = f"{result['gzip_mb']:>8.2f}" if result['gzip_mb'] is not None else f"{'-':>8}"
+        print(f"  {result['renderer']:<14}{stages}{result['total_s']:>8.2f}s{result['peak_rss_mb']:>9.0f}"
+              f"{result['html_mb']:>9.2f}{gz}{result['data_mb']:>9.2f}{result['features']:>10,}")
+    failures = check_budgets(results, budgets)
+    for renderer, metric, value, limit in failures:
+        print(f"❌ {renderer}: {metric} = {value} exceeds budget {limit}")
+    if not failures:
+        print("✅ All renderers within budget")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the map renderers against the checked-in regional feeds.")
+    parser.add_argument("renderers", nargs="*", help=f"Renderers to run: {', '.join(RENDERERS)} (default: all)")
+    parser.add_argument("--budget", help="JSON file of per-renderer limits, e.g. {\"arc_hubs\": {\"total_s\": 10}}")
+    parser.add_argument("--cold", action="store_true", help="Render fragments into an empty cache instead of reusing it")
+    parser.add_argument("--output", help="Write the measurements to this JSON file")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(RESULT_MARKER + json.dumps(run_renderer(args.run_one, args.cold)))
+        sys.exit(0)
+
+    unknown = [name for name in args.renderers if name not in RENDERERS]
+    if unknown:
+        parser.error(f"unknown renderer(s): {', '.join(unknown)}")
+
+    budgets = DEFAULT_BUDGETS
+    if args.budget:
+        with open(args.budget) as f:
+            overrides = json.load(f)
+        # Per renderer, so a file naming one limit keeps that renderer's other limits
+        budgets = {name: {**DEFAULT_BUDGETS.get(name, {}), **overrides.get(name, {})}
+                   for name in {**DEFAULT_BUDGETS, **overrides}}
+
+    results = []
+    for name in args.renderers or list(RENDERERS):
+        print(f"⏱️ Running {name}...")
+        results.append(run_isolated(name, args.cold))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"🗂️ Results saved: {args.output}")
+    failures = print_report(results, budgets)
+    sys.exit(1 if failures else 0)
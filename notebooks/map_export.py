@@ -0,0 +1,53 @@
+import re
+import gzip
+import json
+import time
+from contextlib import nullcontext
+
+from map_layers import TransitGeoJson, load_cached_fragment
+
+# TransitGeoJson layers with a FragmentSource render this in place of their data
+PLACEHOLDER = re.compile(r"null /\*@transit-data (\w+)@\*/")
+
+def _source_layers(element, found=None):
+    """JS name -> TransitGeoJson for every layer in the element tree whose data is streamed."""
+    found = {} if found is None else found
+    for child in element._children.values():
+        if isinstance(child, TransitGeoJson) and child.source is not None:
+            found[child.get_name()] = child
+        _source_layers(child, found)
+    return found
+
+def save_map_streaming(m, path, gzip_copy=False):
+    """Writes a folium map to disk, streaming each layer's GeoJSON from its fragment file.
+
+    The map itself is rendered without layer data, so the page skeleton stays small. Layer data
+    is then JSON-encoded piece by piece straight into the file, holding at most one agency's
+    fragment in memory. With gzip_copy, path + '.gz' is written in the same pass for serving.
+    """
+    start = time.perf_counter()
+    layers = _source_layers(m)
+    pieces = PLACEHOLDER.split(m.get_root().render())
+    encoder = json.JSONEncoder(separators=(',', ':'))
+
+    current_path, fragment = None, None
+    with open(path, 'w', encoding='utf-8') as out, \
+            (gzip.open(path + ".gz", 'wt', encoding='utf-8') if gzip_copy else nullcontext()) as gz:
+        def write(text):
+            out.write(text)
+            if gz:
+                gz.write(text)
+
+        # split() alternates page text and layer names
+        for i, piece in enumerate(pieces):
+            if i % 2 == 0:
+                write(piece)
+                continue
+            source = layers[piece].source
+            if source.path != current_path:
+                current_path, fragment = source.path, load_cached_fragment(source.path)
+            for chunk in encoder.iterencode(source.geojson(fragment)):
+                write(chunk)
+
+    print(f"💾 Streamed {len(layers)} layers to {path}{' (+ .gz)' if gzip_copy else ''} "
+          f"({time.perf_counter() - start:.1f}s)")
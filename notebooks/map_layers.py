@@ -0,0 +1,493 @@
+import os
+import json
+import time
+import base64
+import hashlib
+from math import cos, sin, radians
+from functools import lru_cache
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from branca.element import MacroElement
+from folium.features import DivIcon
+from folium.map import Layer
+from folium.template import Template
+
+from feed_cache import CACHE_DIR, load_feed_cached, zip_content_hash
+from route_index import build_route_indexes
+from shape_simplify import add_significance, simplification_report
+
+FRAGMENT_TABLES = ['agency', 'routes', 'trips', 'stops', 'stop_times', 'shapes']
+RENDER_MODES = ('routes', 'agency')  # One GeoJSON layer per route, or one per agency
+LINE_STYLE = {'weight': 4, 'opacity': 0.8}
+STOP_STYLE = {'fill': True, 'fillOpacity': 0.9, 'weight': 1}
+STOP_RADIUS = {'near': 5, 'far': 2}
+STOP_RADIUS_ZOOM = 14  # Stops are drawn larger above this zoom level
+PIE_SIZE = 40  # Transfer pie charts, in pixels
+
+# Rendered fragments live in cache/fragments/<feed name>/<level>-<key>.json
+FRAGMENT_CACHE_DIR = os.path.join(os.path.dirname(CACHE_DIR), "fragments")
+FRAGMENT_VERSION = 2  # Bump whenever build_agency_fragment's output changes
+
+def _text(value):
+    """GeoJSON-safe property value: None for missing, plain str otherwise."""
+    return None if pd.isna(value) else str(value)
+
+def route_properties(route, agency_name, label, color):
+    """Feature properties for a route line; the popup is built from these in the browser."""
+    return {
+        "kind": "route",
+        "label": label,
+        "agency": agency_name,
+        "route_type": None if pd.isna(route.route_type) else int(route.route_type),
+        "desc": _text(getattr(route, 'route_desc', None)),
+        "color": color
+    }
+
+def stop_properties(stop, labels, color):
+    """Feature properties for a stop and the labels of every route serving it."""
+    return {
+        "kind": "stop",
+        "stop_id": str(stop.stop_id),
+        "name": _text(stop.stop_name),
+        "zone": _text(getattr(stop, 'zone_id', None)),
+        "url": _text(getattr(stop, 'stop_url', None)),
+        "routes": labels,
+        "color": color
+    }
+
+def build_agency_fragment(agency_name, feed, level='full'):
+    """Renders one agency's routes and stops as plain GeoJSON, safe to send between processes.
+
+    Each route holds its line; stops are one shared FeatureCollection with every stop
+    drawn once and the labels of all routes serving it. Shapes are simplified to the
+    given shape_simplify level; the fragment records the vertex and byte reduction under 'shapes'.
+    """
+    has_shapes = feed.shapes is not None and not feed.shapes.empty
+    if has_shapes:
+        feed.shapes = add_significance(feed.shapes)  # Once, for both the index and the report
+    index = build_route_indexes(feed, level)
+    routes = []
+    labels, colors = {}, {}
+    for _, route in feed.routes.iterrows():
+        route_id = route.route_id
+        route_name = route.route_long_name if pd.notna(route.route_long_name) else f"Route {route_id}"
+        route_color = f"#{route.route_color}" if pd.notna(route.route_color) else "blue"
+        label = f"{route_name} ({route_id})"
+        labels[route_id], colors[route_id] = label, route_color
+
+        features = []
+        shape_ids = index['route_shapes'].get(route_id, [])
+        coords = index['shape_coords'].get(shape_ids[0]) if shape_ids else None
+        if coords is not None and len(coords):
+            features.append({
+                "type": "Feature",
+                "properties": route_properties(route, agency_name, label, route_color),
+                "geometry": {"type": "LineString", "coordinates": coords[:, ::-1].round(6).tolist()}
+            })
+
+        routes.append({
+            "route_id": str(route_id),
+            "label": label,
+            "color": route_color,
+            "geojson": {"type": "FeatureCollection", "features": features}
+        })
+
+    # Every stop once, with its routes read off the inverted index
+    stop_index = index['stop_routes']
+    stops = index['stops_by_id'].reindex(stop_index['stop_ids'])
+    stop_features = []
+    for position, stop in enumerate(stops.itertuples(index=False)):
+        if pd.isna(stop.stop_lat) or pd.isna(stop.stop_lon):
+            continue
+        route_ids = stop_index['route_ids'][stop_index['route_codes'][stop_index['indptr'][position]:stop_index['indptr'][position + 1]]]
+        route_ids = [route_id for route_id in route_ids if route_id in labels]
+        if not route_ids:
+            continue
+        stop_features.append({
+            "type": "Feature",
+            "properties": stop_properties(stop, [labels[route_id] for route_id in route_ids], colors[route_ids[0]]),
+            "geometry": {"type": "Point", "coordinates": [round(float(stop.stop_lon), 6), round(float(stop.stop_lat), 6)]}
+        })
+
+    shapes = simplification_report(feed.shapes, level).iloc[0].astype(int).to_dict() if has_shapes else None
+    return {
+        "agency": agency_name,
+        "routes": routes,
+        "stops": {"type": "FeatureCollection", "features": stop_features},
+        "shapes": shapes
+    }
+
+def agency_feature_collection(fragment):
+    """Flattens a fragment into one FeatureCollection: every route line, then the shared stops on top."""
+    lines = [feature for route in fragment['routes'] for feature in route['geojson']['features']]
+    return {"type": "FeatureCollection", "features": lines + fragment['stops']['features']}
+
+def render_agency_fragment(agency_name, feed_path, level='full'):
+    """Worker entry point: loads one feed through the cache and renders its fragment."""
+    start = time.perf_counter()
+    tables = load_feed_cached(feed_path, tables=FRAGMENT_TABLES)
+    feed = SimpleNamespace(**{table: tables.get(table) for table in FRAGMENT_TABLES})
+    fragment = build_agency_fragment(agency_name, feed, level)
+    fragment['seconds'] = round(time.perf_counter() - start, 2)
+    return fragment
+
+def fragment_key(feed_path, agency_name, level):
+    """Cache key for a fragment: the feed's content plus everything that changes how it is rendered."""
+    params = {
+        'feed': zip_content_hash(feed_path),
+        'agency': agency_name,
+        'level': level,
+        'version': FRAGMENT_VERSION
+    }
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+def _fragment_path(feed_path, level, key, cache_dir):
+    return os.path.join(cache_dir, os.path.splitext(os.path.basename(feed_path))[0], f"{level}-{key}.json")
+
+def load_cached_fragment(path):
+    """A cached fragment, or None if it has not been rendered with these inputs."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_fragment(path, fragment):
+    """Stores a fragment and drops the ones it replaces: files in its directory with the same name
+    up to the key (the same feed at the same level), rendered from older inputs. Other levels stay."""
+    feed_dir, file_name = os.path.split(path)
+    prefix = file_name.rsplit('-', 1)[0] + '-' if '-' in file_name else ''
+    os.makedirs(feed_dir, exist_ok=True)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(fragment, f, separators=(',', ':'))
+    os.replace(path + ".tmp", path)
+    for name in os.listdir(feed_dir):
+        if name != file_name and name.startswith(prefix) and name.endswith(".json"):
+            os.remove(os.path.join(feed_dir, name))
+
+def _print_fragment(fragment, level, source):
+    print(f"  🧩 {fragment['agency']}: {len(fragment['routes'])} routes ({source}, {fragment['seconds']}s)")
+    shapes = fragment['shapes']
+    if shapes and level != 'full' and source == "rendered":
+        print(f"     ✂️ shapes at '{level}': {shapes['vertices']:,} -> {shapes['kept_vertices']:,} vertices, "
+              f"{shapes['bytes'] / 1e6:.2f} MB -> {shapes['kept_bytes'] / 1e6:.2f} MB")
+
+def render_fragment_files(feed_paths, workers=None, level='full', cache_dir=FRAGMENT_CACHE_DIR):
+    """Makes sure every agency (name -> feed zip path) has a cached fragment and returns name -> fragment file.
+
+    Only agencies whose feed or render settings changed are rendered, each in its own worker
+    process. Results are written to disk as they arrive and not kept in memory.
+    """
+    paths = {name: _fragment_path(feed_path, level, fragment_key(feed_path, name, level), cache_dir)
+             for name, feed_path in feed_paths.items()}
+    stale = [name for name, path in paths.items() if not os.path.exists(path)]
+    if stale:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {name: pool.submit(render_agency_fragment, name, feed_paths[name], level) for name in stale}
+            for name, future in futures.items():
+                fragment = future.result()
+                save_fragment(paths[name], fragment)
+                _print_fragment(fragment, level, "rendered")
+    print(f"🧩 {len(stale)} of {len(feed_paths)} agency fragments rendered, {len(feed_paths) - len(stale)} from cache")
+    return paths
+
+class FragmentSource:
+    """Where a layer's GeoJSON comes from when the map is streamed by map_export: a fragment file,
+    and the part of it the layer draws ('agency' for everything, 'stops', or a route's position)."""
+
+    def __init__(self, path, part='agency'):
+        self.path = path
+        self.part = part
+
+    def geojson(self, fragment):
+        if self.part == 'agency':
+            return agency_feature_collection(fragment)
+        if self.part == 'stops':
+            return fragment['stops']
+        return fragment['routes'][self.part]['geojson']
+
+class TransitStyle(MacroElement):
+    """Shared canvas renderer, style function and lazy popup builder for TransitGeoJson layers.
+
+    Added to the map once; the style reads each feature's properties and the current zoom,
+    so resizing stops on zoom is a single setStyle per layer.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var transitMap = {{ this._parent.get_name() }};
+        var transitCanvas = L.canvas({padding: 0.5});
+        var transitLayers = [];
+        var transitStyles = {{ this.styles|tojson }};
+
+        function transitStyle(feature) {
+            var p = feature.properties;
+            if (p.kind === 'route') {
+                return Object.assign({color: p.color}, transitStyles.line);
+            }
+            var near = transitMap.getZoom() > transitStyles.stopRadiusZoom;
+            return Object.assign({color: p.color, fillColor: p.color}, transitStyles.stop,
+                                 {radius: near ? transitStyles.stopRadius.near : transitStyles.stopRadius.far});
+        }
+
+        function transitPopup(layer) {
+            var p = layer.feature.properties;
+            if (p.kind === 'route') {
+                return '<b>Route:</b> ' + p.label + '<br>' +
+                       '<b>Agency:</b> ' + p.agency + '<br>' +
+                       '<b>Route Type:</b> ' + p.route_type + '<br>' +
+                       '<b>Description:</b> ' + (p.desc || 'N/A');
+            }
+            var latlng = layer.getLatLng();
+            return '<b>Stop:</b> ' + p.name + '<br>' +
+                   '<b>Stop ID:</b> ' + p.stop_id + '<br>' +
+                   '<b>Location:</b> (' + latlng.lat + ', ' + latlng.lng + ')<br>' +
+                   '<b>Zone ID:</b> ' + (p.zone || 'N/A') + '<br>' +
+                   '<b>Routes:</b> ' + p.routes.join(', ') +
+                   (p.url ? "<br><b>Stop URL:</b> <a href='" + p.url + "' target='_blank'>" + p.url + '</a>' : '');
+        }
+
+        transitMap.on('zoomend', function() {
+            transitLayers.forEach(function(layer) { layer.setStyle(transitStyle); });
+        });
+
+        // Shared stop layers show a stop while any route serving it is toggled on
+        var transitRouteCounts = {};  // "agency|route label" -> visible layers drawing that route
+        var transitStopLayers = [];
+        var transitFilterPending = false;
+
+        function transitFilterStops() {
+            transitFilterPending = false;
+            transitStopLayers.forEach(function(layer) {
+                layer.transitStops.forEach(function(marker) {
+                    var visible = marker.feature.properties.routes.some(function(route) {
+                        return transitRouteCounts[layer.transitAgency + '|' + route] > 0;
+                    });
+                    if (visible !== layer.hasLayer(marker)) {
+                        if (visible) { layer.addLayer(marker); } else { layer.removeLayer(marker); }
+                    }
+                });
+            });
+        }
+
+        function transitScheduleFilter() {
+            // Toggling a whole agency fires one event per route; filter once afterwards
+            if (!transitFilterPending) {
+                transitFilterPending = true;
+                setTimeout(transitFilterStops, 0);
+            }
+        }
+
+        function transitRegisterStops(layer, agency) {
+            layer.transitAgency = agency;
+            layer.transitStops = layer.getLayers();
+            transitStopLayers.push(layer);
+            transitScheduleFilter();
+        }
+
+        transitMap.on('layeradd layerremove', function(e) {
+            var key = e.layer.transitRoute;
+            if (key === undefined) { return; }
+            transitRouteCounts[key] = (transitRouteCounts[key] || 0) + (e.type === 'layeradd' ? 1 : -1);
+            transitScheduleFilter();
+        });
+        {% endmacro %}
+    """)
+
+    def __init__(self):
+        super().__init__()
+        self._name = 'TransitStyle'
+        self.styles = {
+            'line': LINE_STYLE,
+            'stop': STOP_STYLE,
+            'stopRadius': STOP_RADIUS,
+            'stopRadiusZoom': STOP_RADIUS_ZOOM
+        }
+
+class TransitGeoJson(Layer):
+    """A GeoJSON FeatureCollection drawn on the shared canvas with TransitStyle; popups are built on click.
+
+    Give either the data itself or a source; layers with a source render a map_export.PLACEHOLDER
+    instead of data, which save_map_streaming fills from a FragmentSource (other callers may fill it
+    themselves). A layer drawing one route sets route ("agency|label"); an agency's shared stop layer
+    sets stops_of to the agency name, and then shows each stop only while one of its routes is on.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson(
+            {%- if this.source %}null /*@transit-data {{ this.get_name() }}@*/{% else %}{{ this.data|tojson }}{% endif %}, {
+            renderer: transitCanvas,
+            style: transitStyle,
+            pointToLayer: function(feature, latlng) {
+                return L.circleMarker(latlng, {renderer: transitCanvas});
+            },
+            onEachFeature: function(feature, layer) {
+                layer.bindPopup(transitPopup, {maxWidth: 300});
+            }
+        });
+        transitLayers.push({{ this.get_name() }});
+        {%- if this.route %}
+        {{ this.get_name() }}.transitRoute = {{ this.route|tojson }};
+        {%- endif %}
+        {%- if this.stops_of %}
+        transitRegisterStops({{ this.get_name() }}, {{ this.stops_of|tojson }});
+        {%- endif %}
+        {% endmacro %}
+    """)
+
+    def __init__(self, data=None, name=None, source=None, route=None, stops_of=None):
+        super().__init__(name=name, overlay=True)
+        self._name = 'TransitGeoJson'
+        self.data = data
+        self.source = source
+        self.route = route
+        self.stops_of = stops_of
+
+class RouteSelection(MacroElement):
+    """Lets the page embedding the map choose the routes drawn, without re-rendering the map.
+
+    window.transitShowRoutes(routes, selected) takes route_id -> GeoJSON and the selected ids;
+    a route's layer is built the first time it is selected and only toggled after that. Route
+    layers count as group|route_id, so a TransitGeoJson with stops_of=group follows them.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var transitRouteLayers = {};
+        var transitRoutesFitted = false;
+
+        window.transitShowRoutes = function(routes, selected) {
+            var wanted = {};
+            selected.forEach(function(routeId) {
+                wanted[routeId] = true;
+                if (transitRouteLayers[routeId] || !routes[routeId]) { return; }
+                var layer = L.geoJson(routes[routeId], {
+                    renderer: transitCanvas,
+                    style: transitStyle,
+                    onEachFeature: function(feature, layer) {
+                        layer.bindPopup(transitPopup, {maxWidth: 300});
+                    }
+                });
+                layer.transitRoute = {{ this.group|tojson }} + '|' + routeId;
+                transitLayers.push(layer);
+                transitRouteLayers[routeId] = layer;
+            });
+
+            var bounds = L.latLngBounds([]);
+            Object.keys(transitRouteLayers).forEach(function(routeId) {
+                var layer = transitRouteLayers[routeId];
+                if (wanted[routeId] !== transitMap.hasLayer(layer)) {
+                    if (wanted[routeId]) { layer.addTo(transitMap); } else { transitMap.removeLayer(layer); }
+                }
+                if (wanted[routeId]) { bounds.extend(layer.getBounds()); }
+            });
+
+            // Zoom to the first selection only; later toggles keep the user's view
+            if (!transitRoutesFitted && bounds.isValid()) {
+                transitMap.fitBounds(bounds);
+                transitRoutesFitted = true;
+            }
+        };
+        {% endmacro %}
+    """)
+
+    def __init__(self, group):
+        super().__init__()
+        self._name = 'RouteSelection'
+        self.group = group
+
+@lru_cache(maxsize=None)
+def pie_chart_svg(colors):
+    """SVG pie with an equal slice per color, built once per color combination."""
+    svg = '<svg width="40" height="40" viewBox="0 0 2 2" xmlns="http://www.w3.org/2000/svg">'
+    angle_step = 360 / len(colors)
+    for i, color in enumerate(colors):
+        start_angle = angle_step * i
+        end_angle = angle_step * (i + 1)
+        large_arc_flag = 1 if end_angle - start_angle > 180 else 0
+        path_d = (f"M 1 1 L {1 + cos(radians(start_angle))} {1 + sin(radians(start_angle))} "
+                  f"A 1 1 0 {large_arc_flag} 1 {1 + cos(radians(end_angle))} {1 + sin(radians(end_angle))} Z")
+        svg += f'<path d="{path_d}" fill="{color}" stroke="black" stroke-width="0.05"/>'
+    return svg + '</svg>'
+
+class PieChartIcons(MacroElement):
+    """Transfer-stop pie charts as shared CSS classes instead of an inline image per marker.
+
+    icon() hands out a DivIcon whose class draws the pie; each color combination's SVG is
+    written once into the page's stylesheet, and the marker's own size scales it.
+    """
+    _template = Template("""
+        {% macro header(this, kwargs) %}
+        <style>
+            .transit-pie { background-size: 100% 100%; }
+            {%- for colors, class_name in this.classes.items() %}
+            .{{ class_name }} { background-image: url("data:image/svg+xml;base64,{{ this.encoded(colors) }}"); }
+            {%- endfor %}
+        </style>
+        {% endmacro %}
+    """)
+
+    def __init__(self):
+        super().__init__()
+        self._name = 'PieChartIcons'
+        self.classes = {}  # Color tuple -> CSS class name
+
+    @staticmethod
+    def encoded(colors):
+        return base64.b64encode(pie_chart_svg(colors).encode('utf-8')).decode('utf-8')
+
+    def icon(self, colors, size=PIE_SIZE):
+        colors = tuple(colors)
+        if colors not in self.classes:
+            self.classes[colors] = f"transit-pie-{len(self.classes)}"
+        return DivIcon(html='', class_name=f"transit-pie {self.classes[colors]}",
+                       icon_size=(size, size), icon_anchor=(size // 2, size // 2))
+
+def add_pie_chart_icons(m):
+    """The map's shared PieChartIcons, added on first use."""
+    for child in m._children.values():
+        if isinstance(child, PieChartIcons):
+            return child
+    return PieChartIcons().add_to(m)
+
+def add_transit_style(m):
+    """Adds the shared TransitStyle to a map once; it must come before any TransitGeoJson layer."""
+    if not any(isinstance(child, TransitStyle) for child in m._children.values()):
+        TransitStyle().add_to(m)
+
+def add_fragment_to_map(m, fragment, mode='routes', source_path=None):
+    """Adds an agency fragment to a folium map and returns the agency's TreeLayerControl node.
+
+    mode='routes' adds one layer per route, each toggled in the tree; mode='agency' adds a
+    single FeatureCollection for the whole agency. Either way each stop is drawn once; in
+    'routes' mode the agency's stop layer follows the route toggles. With
+    source_path (the fragment's cache file) the layers hold no data until the map is
+    written with map_export.save_map_streaming.
+    """
+    if mode not in RENDER_MODES:
+        raise ValueError(f"Unknown render mode: {mode} (expected one of {RENDER_MODES})")
+    add_transit_style(m)
+
+    if mode == 'agency':
+        if source_path:
+            layer = TransitGeoJson(name=fragment['agency'], source=FragmentSource(source_path))
+        else:
+            layer = TransitGeoJson(agency_feature_collection(fragment), name=fragment['agency'])
+        layer.add_to(m)
+        return {"label": fragment['agency'], "layer": layer}
+
+    agency = fragment['agency']
+    agency_group = {
+        "label": agency,
+        "select_all_checkbox": True,
+        "children": []
+    }
+    for i, route in enumerate(fragment['routes']):
+        data, source = (None, FragmentSource(source_path, i)) if source_path else (route['geojson'], None)
+        layer = TransitGeoJson(data, name=route['label'], source=source, route=f"{agency}|{route['label']}").add_to(m)
+        agency_group["children"].append({"label": route['label'], "layer": layer})
+
+    # Stops once per agency, after the routes they filter on
+    data, source = (None, FragmentSource(source_path, 'stops')) if source_path else (fragment['stops'], None)
+    layer = TransitGeoJson(data, name=f"{agency} stops", source=source, stops_of=agency).add_to(m)
+    agency_group["children"].append({"label": "Stops", "layer": layer})
+    return agency_group
@@ -0,0 +1,110 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from isochrone_polygons import to_metric
+from gtfs_schema import concat_tables
+from feed_cache import load_folder_cached
+
+CLUSTER_RADIUS_M = 75  # Stops of different agencies closer than this are one physical stop
+DEFAULT_TABLES = ['agency', 'routes', 'trips', 'stops', 'stop_times', 'shapes', 'calendar', 'calendar_dates']
+
+# Columns holding feed-local identifiers; these get the agency prefix so IDs never collide across feeds
+ID_COLUMNS = {
+    'agency': ['agency_id'],
+    'routes': ['route_id', 'agency_id'],
+    'trips': ['route_id', 'service_id', 'trip_id', 'shape_id', 'block_id'],
+    'stops': ['stop_id', 'parent_station', 'zone_id'],
+    'stop_times': ['trip_id', 'stop_id'],
+    'shapes': ['shape_id'],
+    'calendar': ['service_id'],
+    'calendar_dates': ['service_id'],
+    'frequencies': ['trip_id'],
+    'transfers': ['from_stop_id', 'to_stop_id'],
+}
+
+def feed_key(file_name):
+    """Short agency key from a feed file name, e.g. 'Butler County (BTA).zip' -> 'BTA'."""
+    match = re.search(r"\(([^)]+)\)", file_name)
+    return match.group(1) if match else os.path.splitext(file_name)[0]
+
+def prefix_ids(df, table, key):
+    """Prefixes a schema-typed table's ID columns with the agency key."""
+    for column in ID_COLUMNS.get(table, []):
+        if column in df.columns:
+            # IDs are categorical, so prefixing only touches the distinct values
+            # (all-empty columns come back from Parquet as plain objects)
+            df[column] = df[column].astype('category').cat.rename_categories(lambda value: f"{key}:{value}")
+    if table in ('agency', 'routes', 'stops'):
+        df['feed'] = pd.Categorical([key] * len(df))
+    return df
+
+def connected_components(size, a, b):
+    """Component label per node for edges (a, b): the smallest node index in its component."""
+    # Union-find by label propagation
+    labels = np.arange(size)
+    while True:
+        linked = np.minimum(labels[a], labels[b])
+        previous = labels.copy()
+        np.minimum.at(labels, a, linked)
+        np.minimum.at(labels, b, linked)
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+def cluster_stops(stops, radius_m=CLUSTER_RADIUS_M):
+    """Assigns a shared stop_cluster_id to stops of different agencies at one physical location.
+
+    Stops seed clusters in table order; each seed claims the nearest unclaimed stop of every
+    other agency within radius_m of it, so a cluster holds at most one stop per agency and never
+    reaches beyond radius_m from its seed. The cluster id is the seed's stop_id.
+    """
+    located = stops[['stop_lat', 'stop_lon']].notna().all(axis=1).values
+    lat = stops['stop_lat'].values[located]
+    lon = stops['stop_lon'].values[located]
+    feeds = pd.factorize(stops['feed'].to_numpy(dtype=object)[located])[0]
+    x, y = to_metric(lat, lon, lat.mean(), lon.mean())
+
+    # Neighbours of other agencies within radius_m, nearest first, as CSR over the stops
+    points = shapely.points(x, y)
+    a, b = shapely.STRtree(points).query(points, predicate='dwithin', distance=radius_m)
+    other = feeds[a] != feeds[b]
+    a, b = a[other], b[other]
+    order = np.lexsort((b, np.hypot(x[a] - x[b], y[a] - y[b]), a))
+    a, b = a[order], b[order]
+    starts = np.searchsorted(a, np.arange(len(points) + 1))
+
+    seed = np.full(len(points), -1)
+    for stop in range(len(points)):
+        if seed[stop] >= 0:
+            continue
+        seed[stop] = stop
+        claimed = {feeds[stop]}
+        for nearby in b[starts[stop]:starts[stop + 1]]:
+            if seed[nearby] < 0 and feeds[nearby] not in claimed:
+                seed[nearby] = stop
+                claimed.add(feeds[nearby])
+
+    stop_ids = stops['stop_id'].to_numpy(dtype=object)
+    cluster_ids = stop_ids.copy()
+    cluster_ids[located] = stop_ids[located][seed]
+    return pd.Series(cluster_ids, index=stops.index, name='stop_cluster_id')
+
+def build_regional_feed(folder_path, tables=DEFAULT_TABLES, cluster_radius_m=CLUSTER_RADIUS_M):
+    """Merges every feed in the folder into one set of tables with agency-prefixed IDs and clustered shared stops."""
+    parts = {table: [] for table in tables}
+    for file_name, feed in load_folder_cached(folder_path, tables).items():
+        key = feed_key(file_name)
+        for table, df in feed.items():
+            parts[table].append(prefix_ids(df, table, key))
+        print(f"✅ Loaded GTFS feed: {file_name} ({key})")
+
+    merged = {table: concat_tables(frames) for table, frames in parts.items() if frames}
+    if 'stops' in merged and cluster_radius_m:
+        merged['stops']['stop_cluster_id'] = cluster_stops(merged['stops'], cluster_radius_m).astype('category')
+        shared = merged['stops'].stop_cluster_id.duplicated(keep=False).sum()
+        print(f"🔗 {shared} stops share a physical location with another agency's stop")
+    return merged
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+def clean_ridership(values):
+    """Ridership counts as numbers: thousands separators dropped, blanks and junk as 0."""
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.fillna(0)
+    return pd.to_numeric(values.astype(str).str.replace(',', ''), errors='coerce').fillna(0)
+
+def build_ridership_cube(ridership, route_column='Route', stop_column='Stop', value_column='Ridership', period_column=None):
+    """Total ridership per route x stop (x period), built once with integer-coded dimensions.
+
+    The cube is a dict: 'routes', 'stops' and 'periods' (None without a period column) are the
+    sorted ids as text, so a code is a position in them; 'route', 'stop' and 'period' hold the
+    codes of every non-empty cell, sorted by route, stop and period, and 'ridership' its total.
+    'cell' is route code * stop count + stop code, for (route, stop) lookups across periods.
+    """
+    keys = ['route', 'stop'] + (['period'] if period_column else [])
+    rows = pd.DataFrame({
+        'route': ridership[route_column].astype(str).to_numpy(),
+        'stop': ridership[stop_column].astype(str).to_numpy(),
+        'ridership': clean_ridership(ridership[value_column]).to_numpy()
+    })
+    if period_column:
+        rows['period'] = ridership[period_column].astype(str).to_numpy()
+
+    cube = {'periods': None, 'period': None}
+    for key in keys:
+        codes, ids = pd.factorize(rows[key], sort=True)
+        rows[key] = codes.astype(np.int32)
+        cube[f"{key}s"] = pd.Index(ids)
+    cells = rows.groupby(keys)['ridership'].sum()
+    for level, key in enumerate(keys):
+        cube[key] = cells.index.get_level_values(level).to_numpy()
+    cube['ridership'] = cells.to_numpy()
+    cube['cell'] = cube['route'].astype(np.int64) * len(cube['stops']) + cube['stop']
+    return cube
+
+def cube_codes(cube, dimension, ids):
+    """Codes of ids (compared as text) along 'routes', 'stops' or 'periods'; -1 for ids not in the cube."""
+    return cube[dimension].get_indexer(pd.Index(ids).astype(str))
+
+def _selected(cube, dimension, ids):
+    """Boolean lookup over a dimension's codes: True for the given ids."""
+    selected = np.zeros(len(cube[dimension]), dtype=bool)
+    codes = cube_codes(cube, dimension, ids)
+    selected[codes[codes >= 0]] = True
+    return selected
+
+def selection_ridership(cube, routes, periods=None):
+    """Total and per-route ridership for the selected routes (and periods; default all) at every stop.
+
+    Returns (totals, by_route): totals is a Series over every stop id in the cube, by_route has
+    one row per stop x selected route with ridership (stop, route, ridership), ordered by route.
+    Cost is one pass over the cube's cells whatever the size of the selection.
+    """
+    mask = _selected(cube, 'routes', routes)[cube['route']]
+    if periods is not None and cube['periods'] is not None:
+        mask &= _selected(cube, 'periods', periods)[cube['period']]
+
+    stop, route, ridership = cube['stop'][mask], cube['route'][mask], cube['ridership'][mask]
+    totals = np.bincount(stop, weights=ridership, minlength=len(cube['stops'])).astype(ridership.dtype)
+    by_route = (pd.DataFrame({'stop': stop, 'route': route, 'ridership': ridership})
+                .groupby(['route', 'stop'], sort=True)['ridership'].sum().reset_index())
+    by_route['stop'] = cube['stops'][by_route['stop']].to_numpy()
+    by_route['route'] = cube['routes'][by_route['route']].to_numpy()
+    return pd.Series(totals, index=cube['stops']), by_route[['stop', 'route', 'ridership']]
+
+def pair_ridership(cube, pairs, route_column='route_id', stop_column='stop_id'):
+    """Ridership for every (route, stop) pair over all periods; pairs with no ridership get 0."""
+    routes = cube_codes(cube, 'routes', pairs[route_column])
+    stops = cube_codes(cube, 'stops', pairs[stop_column])
+    cells = routes.astype(np.int64) * len(cube['stops']) + stops
+    # Cells are sorted, so each pair's periods are one run: sum it from the running total
+    running = np.r_[0, np.cumsum(cube['ridership'])]
+    found = (routes >= 0) & (stops >= 0)
+    ridership = np.where(found, running[np.searchsorted(cube['cell'], cells, 'right')] -
+                         running[np.searchsorted(cube['cell'], cells, 'left')], 0)
+    return pd.Series(ridership, index=pairs.index)
+
+def stop_totals(cube, pairs, route_column='route_id', stop_column='stop_id'):
+    """Total ridership per stop (as text) over the given (route, stop) pairs."""
+    ridership = pair_ridership(cube, pairs, route_column, stop_column)
+    return ridership.groupby(pairs[stop_column].astype(str).to_numpy()).sum()
@@ -0,0 +1,102 @@
+import time
+import argparse
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from shape_simplify import simplify_shapes
+
+def build_shape_coords(shapes):
+    """shape_id -> (n, 2) array of [lat, lon] in shape_pt_sequence order, from one sort of the shapes table."""
+    if shapes is None or shapes.empty:
+        return {}
+    shapes = shapes.sort_values(['shape_id', 'shape_pt_sequence'])
+    codes, shape_ids = pd.factorize(shapes['shape_id'])
+    coords = shapes[['shape_pt_lat', 'shape_pt_lon']].to_numpy(dtype=np.float64)
+    boundaries = np.flatnonzero(np.diff(codes)) + 1
+    return dict(zip(shape_ids, np.split(coords, boundaries)))
+
+def build_stop_route_index(stop_routes):
+    """Stop -> routes inverted index from (stop_id, route_id) pairs, as CSR arrays.
+
+    The routes of stop i are route_ids[route_codes[indptr[i]:indptr[i + 1]]].
+    """
+    pairs = stop_routes[['stop_id', 'route_id']].drop_duplicates()
+    stop_codes, stop_ids = pd.factorize(pairs['stop_id'].to_numpy(dtype=object))
+    route_codes, route_ids = pd.factorize(pairs['route_id'].to_numpy(dtype=object))
+    order = np.lexsort((route_codes, stop_codes))
+    counts = np.bincount(stop_codes, minlength=len(stop_ids))
+    return {
+        'stop_ids': stop_ids,
+        'route_ids': route_ids,
+        'indptr': np.concatenate([[0], np.cumsum(counts)]),
+        'route_codes': route_codes[order],
+    }
+
+def filter_stop_route_index(index, active_routes):
+    """Stops served by any active route: (stop positions in the index, array of active route ids per stop)."""
+    active = np.isin(index['route_ids'], np.asarray(list(active_routes), dtype=object))
+    hits = active[index['route_codes']]
+    if not len(hits):
+        return np.array([], dtype=int), []
+    per_stop = np.add.reduceat(hits.astype(np.int64), index['indptr'][:-1])
+    served = np.split(index['route_ids'][index['route_codes'][hits]], np.cumsum(per_stop)[:-1])
+    positions = np.flatnonzero(per_stop)
+    return positions, [served[position] for position in positions]
+
+def build_route_indexes(feed, level='full'):
+    """Precomputes route -> shape_ids, shape_id -> coordinates, route -> stop_ids and stop -> routes for one feed.
+
+    level picks a shape_simplify tolerance for the coordinates ('full' keeps every vertex).
+    """
+    trips = feed.trips
+
+    route_shapes = {}
+    if 'shape_id' in trips.columns:
+        # Plain lists per group: agg(list) on a categorical shape_id fails on pandas 3
+        route_shapes = {route_id: group.tolist() for route_id, group in
+                        trips.dropna(subset=['shape_id']).drop_duplicates(['route_id', 'shape_id'])
+                        .groupby('route_id', observed=True, sort=False)['shape_id']}
+
+    stop_routes = (feed.stop_times[['trip_id', 'stop_id']].drop_duplicates()
+                   .merge(trips[['trip_id', 'route_id']], on='trip_id')[['route_id', 'stop_id']]
+                   .drop_duplicates())
+    route_stops = {route_id: group.to_numpy(dtype=object) for route_id, group in
+                   stop_routes.groupby('route_id', observed=True, sort=False)['stop_id']}
+
+    shapes = feed.shapes
+    if shapes is not None and not shapes.empty and level != 'full':
+        shapes = simplify_shapes(shapes, level)
+
+    stops_by_id = feed.stops.drop_duplicates('stop_id')
+    stops_by_id.index = pd.Index(stops_by_id['stop_id'].to_numpy(dtype=object))
+
+    return {
+        'route_shapes': route_shapes,
+        'shape_coords': build_shape_coords(shapes),
+        'route_stops': route_stops,
+        'stop_routes': build_stop_route_index(stop_routes),
+        'stops_by_id': stops_by_id,
+    }
+
+def route_stops_frame(index, route_id):
+    """Stops served by a route, looked up from the precomputed index."""
+    stop_ids = index['route_stops'].get(route_id, [])
+    return index['stops_by_id'].reindex(stop_ids).dropna(subset=['stop_lat', 'stop_lon'])
+
+if __name__ == "__main__":
+    from feed_cache import load_feed_cached
+
+    parser = argparse.ArgumentParser(description="Build the route indexes of one GTFS feed and report their sizes.")
+    parser.add_argument("feed", nargs="?", default="notebooks/google_transit.zip", help="GTFS zip")
+    parser.add_argument("--level", default="full", help="shape_simplify level for the shape coordinates")
+    args = parser.parse_args()
+
+    tables = load_feed_cached(args.feed, tables=['trips', 'stops', 'stop_times', 'shapes'])
+    feed = SimpleNamespace(**{table: tables.get(table) for table in ['trips', 'stops', 'stop_times', 'shapes']})
+    start = time.perf_counter()
+    index = build_route_indexes(feed, args.level)
+    print(f"🗂️ Route indexes built ({time.perf_counter() - start:.2f}s): {len(index['route_shapes']):,} routes with shapes, "
+          f"{len(index['shape_coords']):,} shapes, {len(index['route_stops']):,} routes with stops, "
+          f"{len(index['stop_routes']['stop_ids']):,} stops")
@@ -0,0 +1,18 @@
+from functools import lru_cache
+
+MAP_CACHE_SIZE = 32  # Rendered route selections kept in memory per app
+
+def memoize_selection(render_html, cache_size=MAP_CACHE_SIZE):
+    """Wraps render_html(active_routes) -> page string in an LRU keyed by the sorted route selection.
+
+    Dash callbacks return the string directly, so no map file is shared between users.
+    """
+    @lru_cache(maxsize=cache_size)
+    def render_selection(selection):
+        return render_html(list(selection))
+
+    def render(active_routes):
+        return render_selection(tuple(sorted(active_routes or [])))
+
+    render.cache_info = render_selection.cache_info
+    return render
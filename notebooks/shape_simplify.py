@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+from isochrone_polygons import to_metric
+
+# Douglas-Peucker tolerances in metres; a vertex is kept at a level if its significance is at least the tolerance
+SIMPLIFY_LEVELS = {'full': 0.0, 'high': 1.0, 'medium': 5.0, 'low': 20.0}
+EARTH_PX_M = 156543.03  # Web Mercator metres per pixel at zoom 0 on the equator
+
+def vertex_significance(x, y, starts, ends):
+    """Douglas-Peucker significance of every vertex, for all shapes at once.
+
+    starts/ends are the first and last row of each shape. A vertex's significance is the
+    largest tolerance at which Douglas-Peucker still keeps it, so any tolerance level is a
+    plain filter afterwards. Each pass splits every open segment of every shape together.
+    """
+    significance = np.zeros(len(x))
+    significance[starts] = np.inf
+    significance[ends] = np.inf
+
+    a, b = np.asarray(starts), np.asarray(ends)
+    cap = np.full(len(a), np.inf)  # A vertex can't outrank the split that exposed it
+    while True:
+        open_ = b - a >= 2
+        a, b, cap = a[open_], b[open_], cap[open_]
+        if not len(a):
+            break
+
+        counts = b - a - 1
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        segment = np.repeat(np.arange(len(a)), counts)
+        interior = a[segment] + 1 + np.arange(counts.sum()) - offsets[segment]
+
+        # Distance from each interior vertex to its segment's chord
+        ax, ay = x[a][segment], y[a][segment]
+        dx, dy = x[b][segment] - ax, y[b][segment] - ay
+        length2 = dx * dx + dy * dy
+        t = np.clip(((x[interior] - ax) * dx + (y[interior] - ay) * dy) / np.where(length2 > 0, length2, 1), 0, 1)
+        distance = np.hypot(x[interior] - (ax + t * dx), y[interior] - (ay + t * dy))
+
+        farthest = np.maximum.reduceat(distance, offsets)
+        hits = np.flatnonzero(distance == farthest[segment])
+        split = interior[hits[np.unique(segment[hits], return_index=True)[1]]]
+
+        level = np.minimum(farthest, cap)
+        significance[split] = level
+        a, b, cap = np.concatenate([a, split]), np.concatenate([split, b]), np.concatenate([level, level])
+    return significance
+
+def add_significance(shapes):
+    """Sorts a shapes table by shape and sequence and adds a float32 'significance' column (metres)."""
+    shapes = shapes.sort_values(['shape_id', 'shape_pt_sequence'], ignore_index=True)
+    if shapes.empty:
+        return shapes.assign(significance=np.float32(0))
+    lat = shapes['shape_pt_lat'].to_numpy(np.float64)
+    lon = shapes['shape_pt_lon'].to_numpy(np.float64)
+    x, y = to_metric(lat, lon, lat.mean(), lon.mean())
+
+    codes = pd.factorize(shapes['shape_id'])[0]
+    boundaries = np.flatnonzero(np.diff(codes)) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries - 1, [len(shapes) - 1]])
+    shapes['significance'] = vertex_significance(x, y, starts, ends).astype(np.float32)
+    return shapes
+
+def level_for_zoom(zoom, lat=40.44):
+    """Coarsest level whose error stays under half a screen pixel at the given zoom."""
+    half_pixel = EARTH_PX_M * np.cos(np.radians(lat)) / 2 ** zoom / 2
+    fitting = [level for level, tolerance in SIMPLIFY_LEVELS.items() if tolerance <= half_pixel]
+    return max(fitting, key=SIMPLIFY_LEVELS.get)
+
+def simplify_shapes(shapes, level):
+    """Shape vertices kept at a simplification level (adds significance first if needed)."""
+    if 'significance' not in shapes.columns:
+        shapes = add_significance(shapes)
+    return shapes[shapes['significance'] >= SIMPLIFY_LEVELS[level]]
+
+def _geojson_bytes(shapes):
+    """Approximate size of the vertices written as GeoJSON coordinates at 6 decimals."""
+    lat = shapes['shape_pt_lat'].astype(np.float64).round(6).astype(str).str.len()
+    lon = shapes['shape_pt_lon'].astype(np.float64).round(6).astype(str).str.len()
+    return lat + lon + 6  # "[lon, lat], "
+
+def simplification_report(shapes, level, groups=None):
+    """Vertices and approximate GeoJSON bytes before/after simplification, per group (e.g. agency)."""
+    if 'significance' not in shapes.columns:
+        shapes = add_significance(shapes)
+    if groups is None:
+        groups = pd.Series('all', index=shapes.index)
+    frame = pd.DataFrame({
+        'group': np.asarray(groups),
+        'kept': shapes['significance'].to_numpy() >= SIMPLIFY_LEVELS[level],
+        'bytes': _geojson_bytes(shapes).to_numpy()
+    })
+    frame['kept_bytes'] = frame['bytes'].where(frame['kept'], 0)
+    report = frame.groupby('group', sort=False).agg(
+        vertices=('kept', 'size'), kept_vertices=('kept', 'sum'),
+        bytes=('bytes', 'sum'), kept_bytes=('kept_bytes', 'sum'))
+    return report
+
+def print_simplification_report(report, level):
+    """Prints a simplification_report table."""
+    print(f"✂️ Shape simplification at '{level}' ({SIMPLIFY_LEVELS[level]} m):")
+    for group, row in report.iterrows():
+        vertex_cut = 100 * (1 - row.kept_vertices / row.vertices) if row.vertices else 0
+        byte_cut = 100 * (1 - row.kept_bytes / row.bytes) if row.bytes else 0
+        print(f"  {str(group):<35} {row.vertices:>9,} -> {row.kept_vertices:>8,} vertices ({vertex_cut:.0f}% fewer)  "
+              f"{row.bytes / 1e6:6.2f} MB -> {row.kept_bytes / 1e6:6.2f} MB ({byte_cut:.0f}% smaller)")
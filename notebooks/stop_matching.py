@@ -0,0 +1,123 @@
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from isochrone_polygons import to_metric
+
+MATCH_RADIUS_M = 250  # Farthest a ridership record may sit from the GTFS stop it is matched to
+AMBIGUITY_M = 25  # A runner-up on the same route this close to the best distance makes a match ambiguous
+MATCH_KINDS = ('id', 'nearest', 'unmatched')
+
+def match_ridership_stops(ridership, stops, pairs, radius_m=MATCH_RADIUS_M, ambiguity_m=AMBIGUITY_M,
+                          route_column='route_id', stop_column='stop_id', lat_column='Lat', lon_column='Lon'):
+    """GTFS stop for every ridership record: its own stop id where GTFS serves it on the record's route,
+    otherwise the nearest stop on that route within radius_m of the record's Lat/Lon.
+
+    pairs are (stop_id, route_id) pairs as from transfers.stop_route_pairs. Returns a frame on
+    ridership's index: matched_stop_id (None when unresolved), match ('id' / 'nearest' /
+    'unmatched'), distance_m from the record to the matched stop, candidates (the route's stops
+    within radius_m) and ambiguous (a runner-up within ambiguity_m of the best distance).
+    Candidates come from a spatial hash of radius_m cells keyed by route, so only the record's
+    own route in its 3 x 3 cells is ever compared.
+    """
+    records = pd.DataFrame({
+        'route_id': ridership[route_column].astype(str).to_numpy(),
+        'stop_id': ridership[stop_column].astype(str).to_numpy(),
+        'lat': pd.to_numeric(ridership[lat_column], errors='coerce').to_numpy(),
+        'lon': pd.to_numeric(ridership[lon_column], errors='coerce').to_numpy()
+    })
+    located = stops.dropna(subset=['stop_lat', 'stop_lon'])
+    stop_lat = pd.Series(located['stop_lat'].to_numpy(), index=located['stop_id'].astype(str).to_numpy())
+    stop_lon = pd.Series(located['stop_lon'].to_numpy(), index=stop_lat.index)
+    stop_lat, stop_lon = stop_lat[~stop_lat.index.duplicated()], stop_lon[~stop_lon.index.duplicated()]
+    origin = (stop_lat.mean(), stop_lon.mean())
+
+    served = pd.MultiIndex.from_arrays([pairs['route_id'].astype(str), pairs['stop_id'].astype(str)])
+    by_id = pd.MultiIndex.from_arrays([records['route_id'], records['stop_id']]).isin(served)
+
+    result = pd.DataFrame({
+        'matched_stop_id': np.where(by_id, records['stop_id'], None),
+        'match': np.where(by_id, 'id', 'unmatched'),
+        'distance_m': np.nan,
+        'candidates': 0,
+        'ambiguous': False
+    })
+    x, y = to_metric(records['lat'].to_numpy(), records['lon'].to_numpy(), *origin)
+    sx, sy = to_metric(stop_lat.reindex(records['stop_id']).to_numpy(), stop_lon.reindex(records['stop_id']).to_numpy(), *origin)
+    result.loc[by_id, 'distance_m'] = np.hypot(x - sx, y - sy)[by_id]
+
+    # Records left over: hash them and their route's stops into radius_m cells
+    pending = np.flatnonzero(~by_id & np.isfinite(x) & np.isfinite(y))
+    targets = pd.DataFrame({
+        'record': pending,
+        'route_id': records['route_id'].to_numpy()[pending],
+        'cx': np.floor(x[pending] / radius_m).astype(np.int64),
+        'cy': np.floor(y[pending] / radius_m).astype(np.int64)
+    })
+    route_stops = pd.DataFrame({'route_id': served.get_level_values(0), 'stop_id': served.get_level_values(1)})
+    route_stops = route_stops[route_stops['stop_id'].isin(stop_lat.index)].drop_duplicates()
+    route_stops['x'], route_stops['y'] = to_metric(stop_lat[route_stops['stop_id']].to_numpy(),
+                                                   stop_lon[route_stops['stop_id']].to_numpy(), *origin)
+    route_stops['cx'] = np.floor(route_stops['x'] / radius_m).astype(np.int64)
+    route_stops['cy'] = np.floor(route_stops['y'] / radius_m).astype(np.int64)
+
+    found = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            shifted = targets.assign(cx=targets.cx + dx, cy=targets.cy + dy)
+            found.append(shifted.merge(route_stops, on=['route_id', 'cx', 'cy'])[['record', 'stop_id', 'x', 'y']])
+    found = pd.concat(found, ignore_index=True)
+    found['distance_m'] = np.hypot(found['x'].to_numpy() - x[found['record']], found['y'].to_numpy() - y[found['record']])
+    found = found[found['distance_m'] <= radius_m].sort_values(['record', 'distance_m'], kind='stable')
+
+    # Best and runner-up per record are the first two rows of each record after the sort
+    rank = found.groupby('record').cumcount().to_numpy()
+    best = found[rank == 0].set_index('record')
+    runner_up = found[rank == 1].set_index('record')['distance_m'].reindex(best.index)
+    index = best.index.to_numpy()
+    result.loc[index, 'matched_stop_id'] = best['stop_id'].to_numpy()
+    result.loc[index, 'match'] = 'nearest'
+    result.loc[index, 'distance_m'] = best['distance_m'].to_numpy()
+    result.loc[index, 'candidates'] = found.groupby('record').size().reindex(index).to_numpy()
+    result.loc[index, 'ambiguous'] = (runner_up - best['distance_m'] < ambiguity_m).to_numpy()
+    result.index = ridership.index
+    return result
+
+def print_match_report(ridership, matches, route_column='route_id', stop_column='stop_id'):
+    counts = matches['match'].value_counts().reindex(list(MATCH_KINDS), fill_value=0)
+    print(f"📍 {len(matches):,} ridership records: {counts['id']:,} matched by stop id, "
+          f"{counts['nearest']:,} by nearest stop on the route, {counts['unmatched']:,} unmatched")
+    nearest = matches[matches['match'] == 'nearest']
+    if not nearest.empty:
+        p50, p90, worst = nearest['distance_m'].quantile([0.5, 0.9, 1.0])
+        print(f"  nearest-stop distances: median {p50:.0f} m, 90th percentile {p90:.0f} m, max {worst:.0f} m; "
+              f"{nearest['ambiguous'].sum():,} ambiguous")
+        shown = ridership.loc[nearest.index, [route_column, stop_column]].join(nearest)
+        print(shown.sort_values('distance_m', ascending=False).head(10).round(1).to_string())
+    unmatched = matches['match'] == 'unmatched'
+    if unmatched.any():
+        print(f"  unmatched: {ridership.loc[unmatched, [route_column, stop_column]].astype(str).agg(':'.join, axis=1).tolist()[:20]}")
+
+if __name__ == "__main__":
+    from feed_cache import load_feed_cached
+    from transfers import stop_route_pairs
+
+    parser = argparse.ArgumentParser(description="Match ridership records to GTFS stops, by stop id or the nearest stop on the route.")
+    parser.add_argument("ridership", nargs="?", default="notebooks/ridership.csv", help="Ridership CSV (Route, Stop, Lat, Lon)")
+    parser.add_argument("feed", nargs="?", default="notebooks/google_transit.zip", help="GTFS zip")
+    parser.add_argument("--radius", type=float, default=MATCH_RADIUS_M, help="Farthest match in metres")
+    parser.add_argument("--output", help="Write the records with their matches to this CSV")
+    args = parser.parse_args()
+
+    feed = load_feed_cached(args.feed, tables=['trips', 'stops', 'stop_times'])
+    ridership = pd.read_csv(args.ridership)
+    start = time.perf_counter()
+    pairs = stop_route_pairs(feed['trips'], feed['stop_times'])
+    matches = match_ridership_stops(ridership, feed['stops'], pairs, args.radius, route_column='Route', stop_column='Stop')
+    print(f"⏱️ Matched {len(ridership):,} records ({time.perf_counter() - start:.2f}s)")
+    print_match_report(ridership, matches, route_column='Route', stop_column='Stop')
+    if args.output:
+        ridership.join(matches).to_csv(args.output, index=False)
+        print(f"🗂️ Matches saved: {args.output}")
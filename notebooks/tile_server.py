@@ -0,0 +1,59 @@
+import os
+import sqlite3
+import argparse
+
+from flask import Flask, Response, render_template
+
+from vector_tiles import OUTPUT_PATH, read_metadata
+
+# Pages live in the repository's top-level templates folder
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+app = Flask(__name__, template_folder=TEMPLATE_DIR)
+app.config['MBTILES'] = OUTPUT_PATH
+
+def read_tile(path, z, x, y):
+    """Gzipped tile bytes for an XYZ tile, or None if the tile is empty."""
+    con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        row = con.execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, (2 ** z - 1) - y)).fetchone()
+    finally:
+        con.close()
+    return row[0] if row else None
+
+@app.route("/")
+def tile_viewer():
+    metadata = read_metadata(app.config['MBTILES'])
+    center_lon, center_lat, zoom = metadata['center'].split(',')
+    return render_template(
+        "vector_tiles.html",
+        name=metadata['name'],
+        center=[float(center_lat), float(center_lon)],
+        zoom=int(zoom),
+        min_zoom=int(metadata['minzoom']),
+        max_zoom=int(metadata['maxzoom'])
+    )
+
+@app.route("/tiles/<int:z>/<int:x>/<int:y>.pbf")
+def vector_tile(z, x, y):
+    data = read_tile(app.config['MBTILES'], z, x, y)
+    if data is None:
+        return Response(status=204)  # Nothing in view here; VectorGrid treats it as an empty tile
+    return Response(data, mimetype="application/x-protobuf", headers={
+        "Content-Encoding": "gzip",
+        "Cache-Control": "public, max-age=3600"
+    })
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve regional vector tiles from an MBTiles file.")
+    parser.add_argument("--mbtiles", default=OUTPUT_PATH, help="MBTiles file built by vector_tiles.py")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.mbtiles):
+        print(f"⚠️ No tiles at {args.mbtiles} (run vector_tiles.py first)")
+    else:
+        app.config['MBTILES'] = args.mbtiles
+        app.run(debug=True, port=args.port)
@@ -0,0 +1,111 @@
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from isochrone_polygons import to_metric
+
+WALK_TRANSFER_M = 150  # Stops this close are one place to change vehicles on foot
+
+def stop_route_pairs(trips, stop_times):
+    """Distinct (stop_id, route_id) pairs with service, route_id as text."""
+    pairs = stop_times[['trip_id', 'stop_id']].merge(trips[['trip_id', 'route_id']], on='trip_id')
+    pairs = pd.DataFrame({
+        'stop_id': pairs['stop_id'].to_numpy(dtype=object),
+        'route_id': pairs['route_id'].astype(str).to_numpy(dtype=object)
+    })
+    return pairs.drop_duplicates().reset_index(drop=True)
+
+def _stop_info(stops):
+    return stops.drop_duplicates('stop_id').set_index(stops['stop_id'].drop_duplicates().to_numpy(dtype=object))
+
+def find_transfers(pairs, stops):
+    """Stops served by more than one route: stop_id, stop_name, routes (sorted), route_count, coordinates."""
+    route_count = pairs.groupby('stop_id')['route_id'].nunique()
+    shared = pairs[pairs['stop_id'].isin(route_count.index[route_count > 1])]
+    routes = shared.sort_values('route_id').groupby('stop_id')['route_id'].agg(list)
+
+    info = _stop_info(stops).reindex(routes.index)
+    return pd.DataFrame({
+        'stop_id': routes.index.to_numpy(),
+        'stop_name': info['stop_name'].to_numpy(),
+        'routes': routes.to_numpy(),
+        'route_count': route_count.reindex(routes.index).to_numpy(),
+        'coordinates': [[lat, lon] for lat, lon in zip(info['stop_lat'], info['stop_lon'])]
+    })
+
+def walk_transfer_clusters(pairs, stops, radius_m=WALK_TRANSFER_M):
+    """Groups of served stops within radius_m of a seed stop where walking between them reaches
+    routes that no single stop of the group has.
+
+    Seeds are taken best-served first; each claims the unclaimed stops within radius_m of it, so
+    groups never chain beyond a walk from their seed. Returns one row per group (cluster_id is the
+    seed's stop_id): its stop_ids, routes, stop and route counts, the route count of its best single
+    stop, the seed's coordinates and its spread (metres from the seed to the farthest stop).
+    """
+    info = _stop_info(stops)
+    route_count = pairs.groupby('stop_id')['route_id'].nunique()
+    served = info.loc[info.index.isin(route_count.index)].dropna(subset=['stop_lat', 'stop_lon'])
+    served = served.assign(route_count=route_count.reindex(served.index).to_numpy())
+    served = served.iloc[np.lexsort((served.index.astype(str), -served['route_count'].to_numpy()))]
+
+    x, y = to_metric(served['stop_lat'].to_numpy(), served['stop_lon'].to_numpy(),
+                     served['stop_lat'].mean(), served['stop_lon'].mean())
+    points = shapely.points(x, y)
+    a, b = shapely.STRtree(points).query(points, predicate='dwithin', distance=radius_m)
+    order = np.lexsort((b, a))
+    a, b = a[order], b[order]
+    starts = np.searchsorted(a, np.arange(len(points) + 1))
+
+    # Stops are in seed order, so claiming in index order lets the best-served stops seed first
+    seed = np.full(len(points), -1)
+    for stop in range(len(points)):
+        if seed[stop] < 0:
+            nearby = b[starts[stop]:starts[stop + 1]]
+            seed[nearby[seed[nearby] < 0]] = stop
+    cluster_of = pd.Series(served.index.to_numpy()[seed], index=served.index)
+
+    located = pairs[pairs['stop_id'].isin(served.index)]
+    located = located.assign(cluster_id=cluster_of.reindex(located['stop_id']).to_numpy())
+    by_cluster = located.groupby('cluster_id')
+    summary = pd.DataFrame({
+        'stop_count': by_cluster['stop_id'].nunique(),
+        'route_count': by_cluster['route_id'].nunique(),
+        'best_stop_routes': served['route_count'].groupby(cluster_of.to_numpy()).max()
+    })
+    summary = summary[(summary['stop_count'] > 1) & (summary['route_count'] > summary['best_stop_routes'])]
+    if summary.empty:
+        return summary.assign(stop_ids=[], routes=[], stop_lat=[], stop_lon=[], spread_m=[]).reset_index()
+
+    in_group = cluster_of.isin(summary.index).to_numpy()
+    seed_position = seed[in_group]
+    spread = pd.Series(np.hypot(x[in_group] - x[seed_position], y[in_group] - y[seed_position]),
+                       index=cluster_of.to_numpy()[in_group]).groupby(level=0).max()
+
+    chosen = located[located['cluster_id'].isin(summary.index)]
+    summary['stop_ids'] = chosen.groupby('cluster_id')['stop_id'].agg(lambda ids: sorted(set(ids), key=str))
+    summary['routes'] = chosen.groupby('cluster_id')['route_id'].agg(lambda ids: sorted(set(ids)))
+    summary['stop_lat'] = served['stop_lat'].reindex(summary.index)
+    summary['stop_lon'] = served['stop_lon'].reindex(summary.index)
+    summary['spread_m'] = spread.round(1)
+    return summary.rename_axis('cluster_id').reset_index()
+
+if __name__ == "__main__":
+    from regional_feed import build_regional_feed
+
+    parser = argparse.ArgumentParser(description="Same-stop and walk transfers across every regional feed.")
+    parser.add_argument("folder", nargs="?", default="notebooks/Regional GTFS", help="Folder of GTFS zips")
+    parser.add_argument("--radius", type=float, default=WALK_TRANSFER_M, help="Walk transfer radius in metres")
+    args = parser.parse_args()
+
+    feed = build_regional_feed(args.folder, tables=['trips', 'stops', 'stop_times'], cluster_radius_m=None)
+    start = time.perf_counter()
+    pairs = stop_route_pairs(feed['trips'], feed['stop_times'])
+    transfers = find_transfers(pairs, feed['stops'])
+    walks = walk_transfer_clusters(pairs, feed['stops'], args.radius)
+    print(f"🔄 {len(transfers):,} transfer stops and {len(walks):,} walk-transfer clusters "
+          f"from {len(pairs):,} stop-route pairs ({time.perf_counter() - start:.2f}s)")
+    print(walks.sort_values('route_count', ascending=False)
+          [['stop_count', 'route_count', 'best_stop_routes', 'spread_m', 'routes']].head(10).to_string(index=False))
@@ -6,6 +6,7 @@ import heapq
 from pathlib import Path
 import argparse
 from fastapi import FastAPI
+from gtfs_schema import read_gtfs_table, parse_gtfs_time, print_memory_report
 
 app = FastAPI()
 
@@ -44,8 +45,8 @@ class GTFSProcessor:
         self.cursor.execute("""
         CREATE TABLE IF NOT EXISTS stop_times (
             trip_id TEXT,
-            arrival_time TEXT,
-            departure_time TEXT,
+            arrival_time INTEGER,
+            departure_time INTEGER,
             stop_id TEXT,
             stop_sequence INTEGER,
             FOREIGN KEY(trip_id) REFERENCES trips(trip_id),
@@ -70,17 +71,20 @@ class GTFSProcessor:
 
     def _load_data_to_db(self, folder):
         """Loads relevant GTFS CSV files into the database."""
-        stops_df = pd.read_csv(folder / "stops.txt")
+        memory_report = {}
+        stops_df = read_gtfs_table(folder, "stops", memory_report)
         stops_df.to_sql("stops", self.conn, if_exists="replace", index=False)
         
-        routes_df = pd.read_csv(folder / "routes.txt")
+        routes_df = read_gtfs_table(folder, "routes", memory_report)
         routes_df.to_sql("routes", self.conn, if_exists="replace", index=False)
         
-        trips_df = pd.read_csv(folder / "trips.txt")
+        trips_df = read_gtfs_table(folder, "trips", memory_report)
         trips_df.to_sql("trips", self.conn, if_exists="replace", index=False)
         
-        stop_times_df = pd.read_csv(folder / "stop_times.txt")
+        # arrival_time / departure_time are stored as int seconds after midnight
+        stop_times_df = read_gtfs_table(folder, "stop_times", memory_report)
         stop_times_df.to_sql("stop_times", self.conn, if_exists="replace", index=False)
+        print_memory_report(memory_report)
 
     def find_shortest_path(self, origin, destination, time):
         """Finds the shortest transit route using Dijkstra's Algorithm."""
@@ -89,7 +93,7 @@ class GTFSProcessor:
         WHERE departure_time >= ?
         ORDER BY departure_time;
         """
-        self.cursor.execute(query, (time,))
+        self.cursor.execute(query, (int(parse_gtfs_time([time])[0]),))  # numpy ints bind as BLOBs
         stops = self.cursor.fetchall()
         graph = {}
 
@@ -0,0 +1,261 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+
+import numpy as np
+import pandas as pd
+import shapely
+import mapbox_vector_tile
+
+from feed_cache import feeds_fingerprint, file_hash
+from regional_feed import build_regional_feed
+from shape_simplify import add_significance, simplify_shapes, level_for_zoom
+from hub_accessibility import load_hubs
+
+OUTPUT_PATH = "tiles/regional.mbtiles"
+MIN_ZOOM = 8
+MAX_ZOOM = 14  # Leaflet over-zooms the z14 tiles beyond this
+STOP_MIN_ZOOM = 12  # Stops are left out of lower zoom tiles
+EXTENT = 4096  # Tile coordinate units per tile side
+BUFFER = 64  # Tile units drawn past each edge so lines and circles join cleanly
+TILE_TABLES = ['agency', 'routes', 'trips', 'stops', 'stop_times', 'shapes']
+
+def to_world(lat, lon):
+    """Web Mercator coordinates scaled to the unit square (x east, y down), i.e. zoom 0 tile units."""
+    lat = np.radians(np.clip(lat, -85.05112878, 85.05112878))
+    x = np.asarray(lon) / 360 + 0.5
+    y = 0.5 - np.log(np.tan(np.pi / 4 + lat / 2)) / (2 * np.pi)
+    return x, y
+
+def _text(values):
+    """Property column as plain strings (vector tiles can't hold nulls)."""
+    return pd.Series(values).astype(object).where(pd.notna(values), '').astype(str).to_numpy()
+
+def route_properties(routes):
+    """One row of tile properties per route."""
+    routes = routes.drop_duplicates('route_id')
+    names = routes['route_long_name'].where(routes['route_long_name'].notna(), routes['route_short_name'])
+    return pd.DataFrame({
+        'route_id': _text(routes['route_id']),
+        'name': _text(names),
+        'short_name': _text(routes['route_short_name']),
+        'agency': _text(routes['feed']),
+        'color': np.where(routes['route_color'].notna(), '#' + _text(routes['route_color']), '#0000ff')
+    })
+
+def route_lines(shapes, trips, properties, level):
+    """Route geometries (every shape of the route as one MultiLineString) at a simplification level."""
+    kept = simplify_shapes(shapes, level)
+    shape_codes, shape_ids = pd.factorize(kept['shape_id'].astype(str))
+    counts = np.bincount(shape_codes)
+    x, y = to_world(kept['shape_pt_lat'].to_numpy(np.float64), kept['shape_pt_lon'].to_numpy(np.float64))
+    drawable = counts[shape_codes] >= 2
+    lines = np.full(len(shape_ids), None, dtype=object)
+    lines[counts >= 2] = shapely.linestrings(np.column_stack([x, y])[drawable],
+                                             indices=pd.factorize(shape_codes[drawable])[0])
+    line_of_shape = pd.Series(lines, index=shape_ids)
+
+    pairs = trips[['route_id', 'shape_id']].dropna().astype(str).drop_duplicates()
+    pairs = pairs[pairs['shape_id'].isin(line_of_shape.index)]
+    pairs = pairs.assign(line=line_of_shape.reindex(pairs['shape_id']).to_numpy()).dropna(subset=['line'])
+    pairs = pairs[pairs['route_id'].isin(properties['route_id'])]
+    pairs = pairs.sort_values('route_id', kind='stable')
+    route_codes, route_ids = pd.factorize(pairs['route_id'])
+    geometries = shapely.multilinestrings(pairs['line'].to_numpy(), indices=route_codes)
+    frame = properties.set_index('route_id').loc[route_ids].rename_axis('route_id').reset_index()
+    frame['geometry'] = geometries
+    return frame
+
+def stop_points(stops, trips, stop_times, routes):
+    """Stop geometries with the agency, cluster and names of the routes serving each stop."""
+    stop_routes = (stop_times[['trip_id', 'stop_id']].drop_duplicates()
+                   .merge(trips[['trip_id', 'route_id']], on='trip_id')[['stop_id', 'route_id']]
+                   .drop_duplicates().astype(str))
+    short_names = routes.drop_duplicates('route_id').set_index(routes['route_id'].astype(str).drop_duplicates())
+    labels = short_names['route_short_name'].where(short_names['route_short_name'].notna(), short_names['route_id'])
+    stop_routes['label'] = _text(labels.reindex(stop_routes['route_id']).to_numpy())
+    served = stop_routes.groupby('stop_id')['label'].agg(lambda labels: ', '.join(sorted(set(labels))))
+
+    stops = stops.dropna(subset=['stop_lat', 'stop_lon']).drop_duplicates('stop_id')
+    stop_ids = _text(stops['stop_id'])
+    x, y = to_world(stops['stop_lat'].to_numpy(np.float64), stops['stop_lon'].to_numpy(np.float64))
+    return pd.DataFrame({
+        'stop_id': stop_ids,
+        'name': _text(stops['stop_name']),
+        'agency': _text(stops['feed']),
+        'cluster': _text(stops['stop_cluster_id']) if 'stop_cluster_id' in stops.columns else stop_ids,
+        'routes': _text(served.reindex(stop_ids).to_numpy()),
+        'geometry': shapely.points(x, y)
+    })
+
+def hub_points(hubs):
+    """Hub geometries with name and type."""
+    x, y = to_world(hubs['hub_lat'].to_numpy(np.float64), hubs['hub_lon'].to_numpy(np.float64))
+    return pd.DataFrame({
+        'name': _text(hubs['hub_name']),
+        'type': _text(hubs['hub_type']),
+        'geometry': shapely.points(x, y)
+    })
+
+def _drop_stray_parts(geometry):
+    """Keeps only the highest-dimension parts of a clipped GeometryCollection (e.g. the line, not a touching point)."""
+    parts = shapely.get_parts(geometry)
+    dimensions = shapely.get_dimensions(parts)
+    return shapely.union_all(parts[dimensions == dimensions.max()])
+
+def cut_tiles(layers, zoom):
+    """Clips every layer to the tiles it touches at one zoom.
+
+    Returns {(x, y): {layer name: [feature, ...]}} with geometries in tile units (y down).
+    All clipping and shifting is done on whole geometry arrays, per layer.
+    """
+    scale = 2 ** zoom
+    tiles = {}
+    for name, frame in layers.items():
+        if frame.empty:
+            continue
+        geometries = shapely.transform(frame['geometry'].to_numpy(), lambda coords: coords * scale * EXTENT)
+
+        # Candidate tiles over the layer's extent; the tree keeps only tiles something actually touches
+        xmin, ymin, xmax, ymax = shapely.total_bounds(geometries) / EXTENT
+        tx, ty = np.meshgrid(np.arange(int(xmin), int(xmax) + 1), np.arange(int(ymin), int(ymax) + 1))
+        tx, ty = tx.ravel(), ty.ravel()
+        boxes = shapely.box((tx * EXTENT) - BUFFER, (ty * EXTENT) - BUFFER,
+                            ((tx + 1) * EXTENT) + BUFFER, ((ty + 1) * EXTENT) + BUFFER)
+        tile_index, feature_index = shapely.STRtree(geometries).query(boxes, predicate='intersects')
+
+        # clip_by_rect keeps overlapping parts of a line as drawn; one vectorized call per tile
+        order = np.argsort(tile_index, kind='stable')
+        tile_index, feature_index = tile_index[order], feature_index[order]
+        clipped = np.empty(len(feature_index), dtype=object)
+        firsts = np.flatnonzero(np.diff(tile_index, prepend=-1))
+        for first, last in zip(firsts, np.append(firsts[1:], len(tile_index))):
+            x0, y0 = tx[tile_index[first]] * EXTENT, ty[tile_index[first]] * EXTENT
+            clipped[first:last] = shapely.clip_by_rect(geometries[feature_index[first:last]],
+                                                       x0 - BUFFER, y0 - BUFFER, x0 + EXTENT + BUFFER, y0 + EXTENT + BUFFER)
+        collections = shapely.get_type_id(clipped) == shapely.GeometryType.GEOMETRYCOLLECTION
+        clipped[collections] = [_drop_stray_parts(geometry) for geometry in clipped[collections]]
+        keep = ~shapely.is_empty(clipped)
+        clipped, tile_index, feature_index = clipped[keep], tile_index[keep], feature_index[keep]
+
+        # Shift into each tile's own coordinates
+        counts = shapely.get_num_coordinates(clipped)
+        offsets = np.column_stack([tx[tile_index], ty[tile_index]]).repeat(counts, axis=0) * EXTENT
+        clipped = shapely.set_coordinates(clipped.copy(), shapely.get_coordinates(clipped) - offsets)
+
+        records = frame.drop(columns='geometry').to_dict('records')
+        for tile, feature, geometry in zip(tile_index, feature_index, clipped):
+            key = (int(tx[tile]), int(ty[tile]))
+            tiles.setdefault(key, {}).setdefault(name, []).append(
+                {'geometry': geometry, 'properties': records[feature]})
+    return tiles
+
+def encode_tile(layers):
+    """Gzipped Mapbox Vector Tile for one tile's features."""
+    data = mapbox_vector_tile.encode(
+        [{'name': name, 'features': features} for name, features in layers.items()],
+        default_options={'extents': EXTENT, 'y_coord_down': True})
+    return gzip.compress(data)
+
+def write_mbtiles(path, tiles, metadata):
+    """Writes tiles ({(z, x, y): bytes}) and metadata to an MBTiles file, replacing it atomically."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    con = sqlite3.connect(tmp_path)
+    con.executescript("""
+        CREATE TABLE metadata (name TEXT, value TEXT);
+        CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+        CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row);
+    """)
+    con.executemany("INSERT INTO metadata VALUES (?, ?)", [(key, str(value)) for key, value in metadata.items()])
+    # MBTiles rows count from the bottom (TMS)
+    con.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)",
+                    [(z, x, (2 ** z - 1) - y, data) for (z, x, y), data in tiles.items()])
+    con.commit()
+    con.close()
+    os.replace(tmp_path, path)
+
+def read_metadata(path):
+    """MBTiles metadata as a dict."""
+    con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return dict(con.execute("SELECT name, value FROM metadata").fetchall())
+    finally:
+        con.close()
+
+def build_tiles(folder_path, excel_path, output_path=OUTPUT_PATH, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, force=False):
+    """Cuts routes, stops and hubs into vector tiles for every zoom and stores them as MBTiles."""
+    fingerprint = hashlib.sha1(json.dumps({
+        'feeds': feeds_fingerprint(folder_path),
+        'hubs': file_hash(excel_path),
+        'zooms': [min_zoom, max_zoom]
+    }, sort_keys=True).encode()).hexdigest()
+    if not force and os.path.exists(output_path) and read_metadata(output_path).get('fingerprint') == fingerprint:
+        print(f"✅ Feeds and hubs unchanged, reusing {output_path}")
+        return output_path
+
+    start = time.perf_counter()
+    feed = build_regional_feed(folder_path, tables=TILE_TABLES)
+    shapes = add_significance(feed['shapes'])
+    properties = route_properties(feed['routes'])
+    stops = stop_points(feed['stops'], feed['trips'], feed['stop_times'], feed['routes'])
+    hubs = hub_points(load_hubs(excel_path))
+
+    tiles = {}
+    lines_by_level = {}
+    for zoom in range(min_zoom, max_zoom + 1):
+        level = level_for_zoom(zoom, feed['stops']['stop_lat'].mean())
+        if level not in lines_by_level:
+            lines_by_level[level] = route_lines(shapes, feed['trips'], properties, level)
+        layers = {'routes': lines_by_level[level], 'hubs': hubs}
+        if zoom >= STOP_MIN_ZOOM:
+            layers['stops'] = stops
+
+        zoom_start = time.perf_counter()
+        zoom_tiles = cut_tiles(layers, zoom)
+        for (x, y), tile_layers in zoom_tiles.items():
+            tiles[(zoom, x, y)] = encode_tile(tile_layers)
+        size = sum(len(tiles[(zoom, x, y)]) for x, y in zoom_tiles)
+        print(f"  🧱 z{zoom}: {len(zoom_tiles)} tiles, {size / 1e6:.2f} MB, shapes at '{level}' "
+              f"({time.perf_counter() - zoom_start:.1f}s)")
+
+    lat, lon = feed['stops']['stop_lat'], feed['stops']['stop_lon']
+    metadata = {
+        'name': 'Regional transit network',
+        'format': 'pbf',
+        'minzoom': min_zoom,
+        'maxzoom': max_zoom,
+        'bounds': f"{lon.min():.5f},{lat.min():.5f},{lon.max():.5f},{lat.max():.5f}",
+        'center': f"{lon.mean():.5f},{lat.mean():.5f},{min(max_zoom, 10)}",
+        'json': json.dumps({'vector_layers': [
+            {'id': 'routes', 'fields': {'route_id': 'String', 'name': 'String', 'short_name': 'String',
+                                        'agency': 'String', 'color': 'String'}},
+            {'id': 'stops', 'minzoom': STOP_MIN_ZOOM,
+             'fields': {'stop_id': 'String', 'name': 'String', 'agency': 'String', 'cluster': 'String', 'routes': 'String'}},
+            {'id': 'hubs', 'fields': {'name': 'String', 'type': 'String'}}
+        ]}),
+        'fingerprint': fingerprint
+    }
+    write_mbtiles(output_path, tiles, metadata)
+    total = sum(len(data) for data in tiles.values())
+    print(f"🗂️ Tiles saved: {output_path} ({len(tiles)} tiles, {total / 1e6:.2f} MB, "
+          f"{time.perf_counter() - start:.1f}s total)")
+    return output_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build vector tiles (MBTiles) for the regional network.")
+    parser.add_argument("--folder", default="notebooks/Regional GTFS", help="Folder of GTFS .zip feeds")
+    parser.add_argument("--hubs", default="notebooks/Hub_Locations.xlsx", help="Hub locations spreadsheet")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="MBTiles file to write")
+    parser.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    parser.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    parser.add_argument("--force", action="store_true", help="Rebuild even if feeds and hubs are unchanged")
+    args = parser.parse_args()
+
+    build_tiles(args.folder, args.hubs, args.output, args.min_zoom, args.max_zoom, args.force)
@@ -0,0 +1,22 @@
+import os
+import gc
+import importlib.util
+
+# Production entry point for the Regionwide route viewer, e.g.
+#   gunicorn --preload --workers 4 --chdir notebooks viewer_wsgi:server
+# With --preload the viewer is loaded once in the master and shared by the forked workers.
+
+NOTEBOOKS_DIR = os.path.dirname(os.path.abspath(__file__))
+FEED_FOLDER = os.environ.get("GTFS_FOLDER", os.path.join(NOTEBOOKS_DIR, "Regional GTFS"))
+
+# The viewer script's file name has spaces, so it is loaded by path
+spec = importlib.util.spec_from_file_location("regionwide_gtfs", os.path.join(NOTEBOOKS_DIR, "Regionwide GTFS.py"))
+regionwide = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(regionwide)
+
+viewer = regionwide.load_viewer(FEED_FOLDER)
+app = regionwide.generate_app(viewer['route_ids'], viewer['page'], viewer['routes'], viewer['route_ids'][:1])
+server = app.server
+
+# Keep the preloaded data out of the garbage collector's reach so workers don't copy its pages
+gc.freeze()